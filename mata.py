@@ -1,42 +1,326 @@
 import sys
 import os
+import argparse
+import csv
+import hashlib
+import http.client
+import queue
+import io
+import shutil
+import tarfile
+import threading
+import time
+import urllib.parse
+import zipfile
+from abc import ABC, abstractmethod
+# Taken before the heavy imports so the startup report includes them
+STARTUP_STARTED = time.perf_counter()
 import cv2
+import json
+import math
 import sqlite3
 import numpy as np
-from datetime import datetime
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from PyQt5 import QtWidgets, QtGui, QtCore
 
+# Schema Migrations
+# PRAGMA user_version holds the number of applied migrations. Each migration runs in
+# its own transaction, so an interrupted upgrade leaves the database at the previous version.
+DATABASE_PATH = 'podoscope.db'
+GALLERY_DIR = 'Gallery'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def date_to_epoch(text):
+    # visits.date used to be free-form TEXT, so accept the formats seen in older databases
+    for date_format in (DATE_FORMAT, '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y'):
+        try:
+            return int(datetime.strptime(text.strip(), date_format).timestamp())
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+def _migration_1_baseline(cursor):
+    # Create customers table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            age INTEGER,
+            phone TEXT,
+            email TEXT
+        )
+    ''')
+    # Create visits table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            date TEXT,
+            image_path TEXT,
+            note TEXT,
+            FOREIGN KEY(customer_id) REFERENCES customers(id)
+        )
+    ''')
+    # Create visit alignments table (cached registration between two visits)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visit_alignments (
+            visit_a INTEGER NOT NULL,
+            visit_b INTEGER NOT NULL,
+            method TEXT,
+            matrix TEXT,
+            source_stamp TEXT,
+            PRIMARY KEY(visit_a, visit_b),
+            FOREIGN KEY(visit_a) REFERENCES visits(id),
+            FOREIGN KEY(visit_b) REFERENCES visits(id)
+        )
+    ''')
+    # Create visit adjustments table (filter values the visit image was saved with)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visit_adjustments (
+            visit_id INTEGER PRIMARY KEY,
+            brightness INTEGER,
+            contrast INTEGER,
+            saturation INTEGER,
+            shading INTEGER,
+            auto INTEGER,
+            FOREIGN KEY(visit_id) REFERENCES visits(id)
+        )
+    ''')
+    # Create recordings table (session videos of the live feed)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recordings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            visit_id INTEGER,
+            video_path TEXT,
+            duration REAL,
+            frames_written INTEGER,
+            frames_dropped INTEGER,
+            FOREIGN KEY(visit_id) REFERENCES visits(id)
+        )
+    ''')
+
+def _migration_2_visit_date_epoch(cursor):
+    # Keep the original text in visits.date and add an indexed epoch column next to it
+    cursor.execute('ALTER TABLE visits ADD COLUMN date_epoch INTEGER')
+    cursor.execute('SELECT id, date FROM visits')
+    cursor.executemany('UPDATE visits SET date_epoch = ? WHERE id = ?',
+                       [(date_to_epoch(date), visit_id) for visit_id, date in cursor.fetchall()])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_visits_date_epoch ON visits(date_epoch)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_visits_customer_id ON visits(customer_id)')
+
+def _migration_3_visit_images(cursor):
+    # Images from the additional cameras; the primary camera image stays in visits.image_path
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visit_images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            visit_id INTEGER,
+            camera INTEGER,
+            image_path TEXT,
+            skew_ms REAL,
+            FOREIGN KEY(visit_id) REFERENCES visits(id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_visit_images_visit_id ON visit_images(visit_id)')
+
+def _migration_4_file_index(cursor):
+    # Size, mtime and content hash of every file under the Gallery (see reconcile_gallery)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_index (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            hash TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_file_index_hash ON file_index(hash)')
+
+MIGRATIONS = [
+    _migration_1_baseline,
+    _migration_2_visit_date_epoch,
+    _migration_3_visit_images,
+    _migration_4_file_index,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate_database(conn):
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this application supports ({SCHEMA_VERSION}).")
+    for version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def prepare_database(path=DATABASE_PATH):
+    # Run pending migrations on a private connection, so it can be done off the GUI thread
+    conn = sqlite3.connect(path)
+    try:
+        migrate_database(conn)
+    finally:
+        conn.close()
+
+# Storage Backends
+# The GUI talks to a StorageBackend: DatabaseManager keeps the database and the Gallery
+# on this computer, RemoteBackend uses the shared store served by another workstation
+# (see run_server). File paths are the relative paths stored in the database.
+class StorageError(RuntimeError):
+    pass
+
+def show_storage_error(parent, error):
+    # Slots report StorageError here: PyQt5 aborts the application on an exception escaping a slot
+    QtWidgets.QMessageBox.critical(parent, "Chyba úložiska", f"Operácia s úložiskom zlyhala:\n{error}")
+
+class StorageBackend(ABC):
+    def batch(self, calls):
+        # calls is a list of (method name, args) pairs; results come back in the same order
+        return [getattr(self, name)(*args) for name, args in calls]
+
+    # Customers
+    @abstractmethod
+    def add_customer(self, first_name, last_name, age, phone, email):
+        pass
+
+    @abstractmethod
+    def get_customer_by_id(self, customer_id):
+        pass
+
+    @abstractmethod
+    def search_customers(self, search_text):
+        pass
+
+    @abstractmethod
+    def get_all_customers(self):
+        pass
+
+    @abstractmethod
+    def delete_customer(self, customer_id):
+        pass
+
+    # Visits
+    @abstractmethod
+    def add_visit(self, customer_id, date, image_path, note):
+        pass
+
+    @abstractmethod
+    def get_visits_by_customer_id(self, customer_id):
+        pass
+
+    @abstractmethod
+    def get_all_visits(self):
+        pass
+
+    @abstractmethod
+    def get_visits_in_range(self, date_from_epoch, date_to_epoch, customer_id=None):
+        pass
+
+    @abstractmethod
+    def get_visit_by_id(self, visit_id):
+        pass
+
+    @abstractmethod
+    def delete_visit(self, visit_id):
+        pass
+
+    @abstractmethod
+    def update_visit_note(self, visit_id, note):
+        pass
+
+    # Alignments, recordings, adjustments and camera images of a visit
+    @abstractmethod
+    def get_visit_alignment(self, visit_a, visit_b):
+        pass
+
+    @abstractmethod
+    def save_visit_alignment(self, visit_a, visit_b, method, matrix, source_stamp):
+        pass
+
+    @abstractmethod
+    def add_recording(self, visit_id, video_path, duration, frames_written, frames_dropped):
+        pass
+
+    @abstractmethod
+    def get_recordings_by_visit_id(self, visit_id):
+        pass
+
+    @abstractmethod
+    def save_visit_adjustments(self, visit_id, brightness, contrast, saturation, shading, auto):
+        pass
+
+    @abstractmethod
+    def get_visit_adjustments(self, visit_id):
+        pass
+
+    @abstractmethod
+    def add_visit_image(self, visit_id, camera, image_path, skew_ms):
+        pass
+
+    @abstractmethod
+    def get_visit_images(self, visit_id):
+        pass
+
+    @abstractmethod
+    def bulk_import(self, records):
+        pass
+
+    # Files
+    @abstractmethod
+    def load_image(self, path):
+        pass
+
+    @abstractmethod
+    def store_image(self, path, image):
+        pass
+
+    @abstractmethod
+    def image_stamp(self, path):
+        pass
+
+    @abstractmethod
+    def staging_path(self, path):
+        # Local file a new file for `path` is written to before store_file is called
+        pass
+
+    @abstractmethod
+    def store_file(self, path, local_path):
+        pass
+
+    @abstractmethod
+    def delete_file(self, path):
+        pass
+
+    @abstractmethod
+    def local_file(self, path):
+        # Local copy of a stored file, or None when it does not exist
+        pass
+
 # Database Manager
-class DatabaseManager:
-    def __init__(self):
-        self.conn = sqlite3.connect('podoscope.db')
-        self.create_tables()
+# Rows are returned as sqlite3.Row objects: they support row['column'] like the dicts
+# used before, but share the column names with the cursor instead of copying them per row.
+class DatabaseManager(StorageBackend):
+    def __init__(self, path=DATABASE_PATH, check_same_thread=True):
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.conn.row_factory = sqlite3.Row
+        self.migrate()
 
-    def create_tables(self):
-        cursor = self.conn.cursor()
-        # Create customers table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS customers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                first_name TEXT NOT NULL,
-                last_name TEXT NOT NULL,
-                age INTEGER,
-                phone TEXT,
-                email TEXT
-            )
-        ''')
-        # Create visits table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS visits (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                customer_id INTEGER,
-                date TEXT,
-                image_path TEXT,
-                note TEXT,
-                FOREIGN KEY(customer_id) REFERENCES customers(id)
-            )
-        ''')
-        self.conn.commit()
+    def schema_version(self):
+        return schema_version(self.conn)
+
+    def migrate(self):
+        migrate_database(self.conn)
 
     def add_customer(self, first_name, last_name, age, phone, email):
         cursor = self.conn.cursor()
@@ -50,12 +334,7 @@ class DatabaseManager:
     def get_customer_by_id(self, customer_id):
         cursor = self.conn.cursor()
         cursor.execute('SELECT * FROM customers WHERE id = ?', (customer_id,))
-        row = cursor.fetchone()
-        if row:
-            keys = ['id', 'first_name', 'last_name', 'age', 'phone', 'email']
-            return dict(zip(keys, row))
-        else:
-            return None
+        return cursor.fetchone()
 
     def search_customers(self, search_text):
         cursor = self.conn.cursor()
@@ -64,16 +343,12 @@ class DatabaseManager:
             SELECT * FROM customers
             WHERE first_name LIKE ? OR last_name LIKE ? OR phone LIKE ? OR email LIKE ?
         ''', (query, query, query, query))
-        rows = cursor.fetchall()
-        keys = ['id', 'first_name', 'last_name', 'age', 'phone', 'email']
-        return [dict(zip(keys, row)) for row in rows]
+        return cursor.fetchall()
 
     def get_all_customers(self):
         cursor = self.conn.cursor()
         cursor.execute('SELECT * FROM customers')
-        rows = cursor.fetchall()
-        keys = ['id', 'first_name', 'last_name', 'age', 'phone', 'email']
-        return [dict(zip(keys, row)) for row in rows]
+        return cursor.fetchall()
 
     def delete_customer(self, customer_id):
         cursor = self.conn.cursor()
@@ -83,54 +358,1984 @@ class DatabaseManager:
     def add_visit(self, customer_id, date, image_path, note):
         cursor = self.conn.cursor()
         cursor.execute('''
-            INSERT INTO visits (customer_id, date, image_path, note)
-            VALUES (?, ?, ?, ?)
-        ''', (customer_id, date, image_path, note))
+            INSERT INTO visits (customer_id, date, date_epoch, image_path, note)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (customer_id, date, date_to_epoch(date), image_path, note))
         self.conn.commit()
         return cursor.lastrowid
 
     def get_visits_by_customer_id(self, customer_id):
         cursor = self.conn.cursor()
         cursor.execute('SELECT * FROM visits WHERE customer_id = ?', (customer_id,))
-        rows = cursor.fetchall()
-        keys = ['id', 'customer_id', 'date', 'image_path', 'note']
-        return [dict(zip(keys, row)) for row in rows]
+        return cursor.fetchall()
 
     def get_all_visits(self):
         cursor = self.conn.cursor()
         cursor.execute('SELECT * FROM visits')
-        rows = cursor.fetchall()
-        keys = ['id', 'customer_id', 'date', 'image_path', 'note']
-        return [dict(zip(keys, row)) for row in rows]
+        return cursor.fetchall()
+
+    def get_visits_in_range(self, date_from_epoch, date_to_epoch, customer_id=None):
+        # Visits with date_from_epoch <= date_epoch < date_to_epoch, joined with the customer name
+        cursor = self.conn.cursor()
+        query = '''
+            SELECT visits.*, customers.first_name, customers.last_name FROM visits
+            LEFT JOIN customers ON customers.id = visits.customer_id
+            WHERE visits.date_epoch >= ? AND visits.date_epoch < ?
+        '''
+        parameters = [date_from_epoch, date_to_epoch]
+        if customer_id:
+            query += ' AND visits.customer_id = ?'
+            parameters.append(customer_id)
+        cursor.execute(query + ' ORDER BY visits.date_epoch', parameters)
+        return cursor.fetchall()
 
     def get_visit_by_id(self, visit_id):
         cursor = self.conn.cursor()
         cursor.execute('SELECT * FROM visits WHERE id = ?', (visit_id,))
+        return cursor.fetchone()
+
+    def delete_visit(self, visit_id):
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM visits WHERE id = ?', (visit_id,))
+        self.conn.commit()
+
+    def update_visit_note(self, visit_id, note):
+        cursor = self.conn.cursor()
+        cursor.execute('UPDATE visits SET note = ? WHERE id = ?', (note, visit_id))
+        self.conn.commit()
+
+    def get_visit_alignment(self, visit_a, visit_b):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT visit_a, visit_b, method, matrix, source_stamp FROM visit_alignments
+            WHERE visit_a = ? AND visit_b = ?
+        ''', (visit_a, visit_b))
         row = cursor.fetchone()
         if row:
-            keys = ['id', 'customer_id', 'date', 'image_path', 'note']
-            return dict(zip(keys, row))
+            alignment = dict(row)
+            alignment['matrix'] = np.array(json.loads(alignment['matrix']), dtype=np.float64).reshape(3, 3)
+            return alignment
         else:
             return None
 
-    def delete_visit(self, visit_id):
+    def save_visit_alignment(self, visit_a, visit_b, method, matrix, source_stamp):
         cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM visits WHERE id = ?', (visit_id,))
+        cursor.execute('''
+            INSERT OR REPLACE INTO visit_alignments (visit_a, visit_b, method, matrix, source_stamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (visit_a, visit_b, method, json.dumps(np.asarray(matrix, dtype=np.float64).ravel().tolist()), source_stamp))
         self.conn.commit()
 
+    def add_recording(self, visit_id, video_path, duration, frames_written, frames_dropped):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO recordings (visit_id, video_path, duration, frames_written, frames_dropped)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (visit_id, video_path, duration, frames_written, frames_dropped))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def get_recordings_by_visit_id(self, visit_id):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM recordings WHERE visit_id = ?', (visit_id,))
+        return cursor.fetchall()
+
+    def save_visit_adjustments(self, visit_id, brightness, contrast, saturation, shading, auto):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO visit_adjustments (visit_id, brightness, contrast, saturation, shading, auto)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (visit_id, brightness, contrast, saturation, shading, int(auto)))
+        self.conn.commit()
+
+    def get_visit_adjustments(self, visit_id):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM visit_adjustments WHERE visit_id = ?', (visit_id,))
+        return cursor.fetchone()
+
+    def add_visit_image(self, visit_id, camera, image_path, skew_ms):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO visit_images (visit_id, camera, image_path, skew_ms)
+            VALUES (?, ?, ?, ?)
+        ''', (visit_id, camera, image_path, skew_ms))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def get_visit_images(self, visit_id):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM visit_images WHERE visit_id = ? ORDER BY camera', (visit_id,))
+        return cursor.fetchall()
+
+    def get_file_index(self):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM file_index')
+        return {row['path']: row for row in cursor.fetchall()}
+
+    def update_file_index(self, entries, removed_paths):
+        # entries are (path, size, mtime_ns, hash) tuples
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            cursor.executemany('''
+                INSERT OR REPLACE INTO file_index (path, size, mtime_ns, hash)
+                VALUES (?, ?, ?, ?)
+            ''', entries)
+            cursor.executemany('DELETE FROM file_index WHERE path = ?', [(path,) for path in removed_paths])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def get_referenced_files(self):
+        # (kind, visit id, path) for every file the database points to
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT 'visit' AS kind, id AS visit_id, image_path AS path FROM visits WHERE image_path IS NOT NULL
+            UNION ALL
+            SELECT 'camera', visit_id, image_path FROM visit_images WHERE image_path IS NOT NULL
+            UNION ALL
+            SELECT 'recording', visit_id, video_path FROM recordings WHERE video_path IS NOT NULL
+        ''')
+        return cursor.fetchall()
+
+    def get_orphaned_visits(self):
+        # Visits whose customer has been deleted
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT visits.* FROM visits
+            LEFT JOIN customers ON customers.id = visits.customer_id
+            WHERE customers.id IS NULL
+        ''')
+        return cursor.fetchall()
+
+    def delete_visits(self, visit_ids):
+        # Removes the visits together with the rows that belong to them
+        parameters = [(visit_id,) for visit_id in visit_ids]
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            cursor.executemany('DELETE FROM visit_images WHERE visit_id = ?', parameters)
+            cursor.executemany('DELETE FROM visit_adjustments WHERE visit_id = ?', parameters)
+            cursor.executemany('DELETE FROM recordings WHERE visit_id = ?', parameters)
+            cursor.executemany('DELETE FROM visit_alignments WHERE visit_a = ? OR visit_b = ?',
+                               [(visit_id, visit_id) for visit_id in visit_ids])
+            cursor.executemany('DELETE FROM visits WHERE id = ?', parameters)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def bulk_import(self, records):
+        # All-or-nothing import of validated records (see validate_import_rows); customers and
+        # visits already in the database are matched by customer_key and skipped
+        stats = {'customers_added': 0, 'customers_existing': 0, 'visits_added': 0, 'visits_duplicate': 0}
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT id, first_name, last_name, phone, email FROM customers')
+            customer_ids = {customer_key(row['first_name'], row['last_name'], row['phone'], row['email']): row['id']
+                            for row in cursor.fetchall()}
+
+            new_customers = {}
+            for record in records:
+                key = customer_key(record['first_name'], record['last_name'], record['phone'], record['email'])
+                if key not in customer_ids and key not in new_customers:
+                    new_customers[key] = (record['first_name'], record['last_name'], record['age'],
+                                          record['phone'], record['email'])
+            stats['customers_added'] = len(new_customers)
+            stats['customers_existing'] = len({customer_key(record['first_name'], record['last_name'], record['phone'], record['email'])
+                                               for record in records} & customer_ids.keys())
+
+            # executemany gives no row ids back, so read the new rows after the highest existing id
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM customers')
+            last_id = cursor.fetchone()[0]
+            cursor.executemany('''
+                INSERT INTO customers (first_name, last_name, age, phone, email)
+                VALUES (?, ?, ?, ?, ?)
+            ''', list(new_customers.values()))
+            cursor.execute('SELECT id, first_name, last_name, phone, email FROM customers WHERE id > ?', (last_id,))
+            for row in cursor.fetchall():
+                customer_ids[customer_key(row['first_name'], row['last_name'], row['phone'], row['email'])] = row['id']
+
+            cursor.execute('SELECT customer_id, date_epoch, image_path FROM visits')
+            known_visits = {(row['customer_id'], row['date_epoch'], normalize_store_path(row['image_path']) if row['image_path'] else None)
+                            for row in cursor.fetchall()}
+            new_visits = []
+            for record in records:
+                # Rows without an image only carry the customer
+                if not record['image_path']:
+                    continue
+                customer_id = customer_ids[customer_key(record['first_name'], record['last_name'], record['phone'], record['email'])]
+                visit_key = (customer_id, record['date_epoch'], record['image_path'])
+                if visit_key in known_visits:
+                    stats['visits_duplicate'] += 1
+                    continue
+                known_visits.add(visit_key)
+                new_visits.append((customer_id, record['date'], record['date_epoch'], record['image_path'], record['note']))
+            cursor.executemany('''
+                INSERT INTO visits (customer_id, date, date_epoch, image_path, note)
+                VALUES (?, ?, ?, ?, ?)
+            ''', new_visits)
+            stats['visits_added'] = len(new_visits)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return stats
+
+    def load_image(self, path):
+        return cv2.imread(path) if path else None
+
+    def store_image(self, path, image):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return cv2.imwrite(path, image)
+
+    def image_stamp(self, path):
+        return image_stamp(path) if path else None
+
+    def staging_path(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return path
+
+    def store_file(self, path, local_path):
+        if os.path.abspath(local_path) != os.path.abspath(path):
+            self.staging_path(path)
+            shutil.move(local_path, path)
+
+    def delete_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def local_file(self, path):
+        return path if os.path.exists(path) else None
+
+# Shared Store Service
+# `python mata.py --serve` shares this workstation's database and Gallery with the
+# others over HTTP. Database calls go to /rpc, or /rpc/batch for several calls in one
+# round trip, and run on pooled connections. Files are streamed from /files/<path>
+# with ETag revalidation and byte ranges, uploaded with PUT and removed with DELETE.
+# Only images and videos inside GALLERY_DIR are reachable there, never the database,
+# settings or code. The service listens on localhost unless a token is configured.
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8765
+SERVER_POOL_SIZE = 4
+TRANSFER_CHUNK_SIZE = 64 * 1024
+TOKEN_HEADER = 'X-Podoscope-Token'
+STORE_FILE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.mp4', '.avi'}
+LOOPBACK_HOSTS = {'127.0.0.1', 'localhost', '::1'}
+RPC_METHODS = {
+    'add_customer', 'get_customer_by_id', 'search_customers', 'get_all_customers', 'delete_customer',
+    'add_visit', 'get_visits_by_customer_id', 'get_all_visits', 'get_visits_in_range', 'get_visit_by_id',
+    'delete_visit', 'update_visit_note', 'get_visit_alignment', 'save_visit_alignment',
+    'add_recording', 'get_recordings_by_visit_id', 'save_visit_adjustments', 'get_visit_adjustments',
+    'add_visit_image', 'get_visit_images', 'bulk_import',
+}
+CUSTOMER_WRITE_METHODS = {'add_customer', 'delete_customer', 'bulk_import'}
+
+def _json_default(value):
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def normalize_store_path(path):
+    # Paths written on Windows use backslashes
+    return path.replace('\\', '/')
+
+class ConnectionPool:
+    def __init__(self, path, size=SERVER_POOL_SIZE):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(DatabaseManager(path, check_same_thread=False))
+
+    @contextmanager
+    def connection(self):
+        db_manager = self.connections.get()
+        try:
+            yield db_manager
+        finally:
+            self.connections.put(db_manager)
+
+class StoreRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def authorized(self):
+        if self.server.token and self.headers.get(TOKEN_HEADER) != self.server.token:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(403, {'error': "Invalid token."})
+            return False
+        return True
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def run_call(self, db_manager, call):
+        if call['method'] not in RPC_METHODS:
+            raise ValueError(f"Unknown method {call['method']}.")
+        return getattr(db_manager, call['method'])(*call.get('args', []))
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        try:
+            payload = self.read_json()
+        except Exception as error:
+            # The body may not have been read completely
+            self.close_connection = True
+            self.send_json(400, {'error': f"Invalid request: {error}"})
+            return
+        try:
+            with self.server.pool.connection() as db_manager:
+                if self.path == '/rpc':
+                    result = self.run_call(db_manager, payload)
+                elif self.path == '/rpc/batch':
+                    result = [self.run_call(db_manager, call) for call in payload]
+                else:
+                    self.send_json(404, {'error': "Not found."})
+                    return
+        except Exception as error:
+            self.send_json(500, {'error': str(error)})
+            return
+        self.send_json(200, {'result': result})
+
+    def resolve_file(self):
+        if not self.path.startswith('/files/'):
+            return None
+        path = normalize_store_path(urllib.parse.unquote(self.path[len('/files/'):]))
+        full_path = os.path.realpath(os.path.join(self.server.root, path))
+        # Never serve anything outside the Gallery, and only image and video files
+        gallery_root = os.path.realpath(os.path.join(self.server.root, GALLERY_DIR))
+        if not full_path.startswith(gallery_root + os.sep):
+            return None
+        if os.path.splitext(full_path)[1].lower() not in STORE_FILE_EXTENSIONS:
+            return None
+        return full_path
+
+    def do_HEAD(self):
+        self.send_file(head_only=True)
+
+    def do_GET(self):
+        self.send_file(head_only=False)
+
+    def send_file(self, head_only):
+        if not self.authorized():
+            return
+        full_path = self.resolve_file()
+        if full_path is None or not os.path.isfile(full_path):
+            self.send_json(404, {'error': "Not found."})
+            return
+
+        etag = f'"{image_stamp(full_path)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        size = os.path.getsize(full_path)
+        start, end, status = 0, size - 1, 200
+        requested_range = self.headers.get('Range', '')
+        if requested_range.startswith('bytes='):
+            first, _, last = requested_range[len('bytes='):].partition('-')
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if head_only:
+            return
+
+        with open(full_path, 'rb') as stored_file:
+            stored_file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = stored_file.read(min(TRANSFER_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def do_PUT(self):
+        if not self.authorized():
+            return
+        full_path = self.resolve_file()
+        if full_path is None:
+            # The body was not read, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(404, {'error': "Not found."})
+            return
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        # Stream the body to a temporary file and swap it in once complete
+        partial_path = full_path + '.part'
+        remaining = int(self.headers.get('Content-Length', 0))
+        with open(partial_path, 'wb') as partial_file:
+            while remaining > 0:
+                chunk = self.rfile.read(min(TRANSFER_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                partial_file.write(chunk)
+                remaining -= len(chunk)
+        if remaining:
+            os.remove(partial_path)
+            self.close_connection = True
+            self.send_json(400, {'error': "Incomplete upload."})
+            return
+        os.replace(partial_path, full_path)
+        self.send_json(200, {'result': image_stamp(full_path)})
+
+    def do_DELETE(self):
+        if not self.authorized():
+            return
+        full_path = self.resolve_file()
+        if full_path is None:
+            self.send_json(404, {'error': "Not found."})
+            return
+        try:
+            os.remove(full_path)
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            self.send_json(500, {'error': str(error)})
+            return
+        self.send_json(200, {'result': True})
+
+def run_server(host=SERVER_HOST, port=SERVER_PORT, root='.', token=None):
+    root = os.path.realpath(root)
+    server = ThreadingHTTPServer((host, port), StoreRequestHandler)
+    server.root = root
+    server.token = token
+    server.pool = ConnectionPool(os.path.join(root, DATABASE_PATH))
+    return server
+
+# Remote Backend
+# Talks to run_server over one keep-alive connection per thread. The customer list is
+# cached for REMOTE_CACHE_SECONDS (and searched locally), and downloaded files are kept
+# in REMOTE_CACHE_DIR and only re-fetched when the server's ETag changes.
+REMOTE_CACHE_SECONDS = 30
+REMOTE_CACHE_DIR = 'remote_cache'
+# Captures that could not be stored are kept here so they are not lost
+UNSAVED_CAPTURE_DIR = 'unsaved_captures'
+REMOTE_TIMEOUT = 10
+REMOTE_RESUME_ATTEMPTS = 3
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT'}
+# Raised when the server had already closed an idle keep-alive connection
+STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+class RemoteStorageError(StorageError):
+    pass
+
+class RemoteBackend(StorageBackend):
+    def __init__(self, url, token=None, cache_dir=REMOTE_CACHE_DIR):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or SERVER_PORT
+        self.token = token
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.local = threading.local()
+        self.customers = None
+        self.customers_loaded = 0.0
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        for attempt in range(2):
+            connection = getattr(self.local, 'connection', None)
+            reused = connection is not None
+            if connection is None:
+                connection = self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=REMOTE_TIMEOUT)
+            try:
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+                connection.request(method, path, body=body, headers=headers)
+                return connection.getresponse()
+            except (http.client.HTTPException, OSError) as error:
+                connection.close()
+                self.local.connection = None
+                # Reconnect once when the server closed an idle keep-alive connection. Other
+                # failures (a timeout in particular) may come after the server ran the call,
+                # so only requests that are safe to repeat are sent again.
+                retry = method in IDEMPOTENT_METHODS or (reused and isinstance(error, STALE_CONNECTION_ERRORS))
+                if attempt or not retry:
+                    raise RemoteStorageError(f"Shared store at {self.host}:{self.port} is not reachable: {error}") from error
+
+    def read_result(self, response):
+        try:
+            payload = json.loads(response.read().decode('utf-8'))
+        except ValueError as error:
+            raise RemoteStorageError(f"Unexpected response from the shared store (HTTP {response.status}).") from error
+        if response.status != 200:
+            raise RemoteStorageError(payload.get('error', f"HTTP {response.status}"))
+        return payload['result']
+
+    def call(self, name, *args):
+        body = json.dumps({'method': name, 'args': args}, default=_json_default)
+        return self.read_result(self.request('POST', '/rpc', body, {'Content-Type': 'application/json'}))
+
+    def batch(self, calls):
+        body = json.dumps([{'method': name, 'args': args} for name, args in calls], default=_json_default)
+        results = self.read_result(self.request('POST', '/rpc/batch', body, {'Content-Type': 'application/json'}))
+        if any(name in CUSTOMER_WRITE_METHODS for name, _ in calls):
+            self.customers = None
+        return results
+
+    def add_customer(self, first_name, last_name, age, phone, email):
+        self.customers = None
+        return self.call('add_customer', first_name, last_name, age, phone, email)
+
+    def get_customer_by_id(self, customer_id):
+        for customer in self.get_all_customers():
+            if customer['id'] == customer_id:
+                return customer
+        return self.call('get_customer_by_id', customer_id)
+
+    def search_customers(self, search_text):
+        # Filtered locally from the cached list instead of a round trip per keystroke
+        search_text = search_text.lower()
+        return [customer for customer in self.get_all_customers()
+                if any(search_text in (customer[key] or '').lower() for key in ('first_name', 'last_name', 'phone', 'email'))]
+
+    def get_all_customers(self):
+        if self.customers is None or time.monotonic() - self.customers_loaded > REMOTE_CACHE_SECONDS:
+            self.customers = self.call('get_all_customers')
+            self.customers_loaded = time.monotonic()
+        return self.customers
+
+    def delete_customer(self, customer_id):
+        self.customers = None
+        return self.call('delete_customer', customer_id)
+
+    def add_visit(self, customer_id, date, image_path, note):
+        return self.call('add_visit', customer_id, date, normalize_store_path(image_path), note)
+
+    def get_visits_by_customer_id(self, customer_id):
+        return self.call('get_visits_by_customer_id', customer_id)
+
+    def get_all_visits(self):
+        return self.call('get_all_visits')
+
+    def get_visits_in_range(self, date_from_epoch, date_to_epoch, customer_id=None):
+        return self.call('get_visits_in_range', date_from_epoch, date_to_epoch, customer_id)
+
+    def get_visit_by_id(self, visit_id):
+        return self.call('get_visit_by_id', visit_id)
+
+    def delete_visit(self, visit_id):
+        return self.call('delete_visit', visit_id)
+
+    def update_visit_note(self, visit_id, note):
+        return self.call('update_visit_note', visit_id, note)
+
+    def get_visit_alignment(self, visit_a, visit_b):
+        alignment = self.call('get_visit_alignment', visit_a, visit_b)
+        if alignment:
+            alignment['matrix'] = np.array(alignment['matrix'], dtype=np.float64).reshape(3, 3)
+        return alignment
+
+    def save_visit_alignment(self, visit_a, visit_b, method, matrix, source_stamp):
+        return self.call('save_visit_alignment', visit_a, visit_b, method, matrix, source_stamp)
+
+    def add_recording(self, visit_id, video_path, duration, frames_written, frames_dropped):
+        return self.call('add_recording', visit_id, normalize_store_path(video_path), duration, frames_written, frames_dropped)
+
+    def get_recordings_by_visit_id(self, visit_id):
+        return self.call('get_recordings_by_visit_id', visit_id)
+
+    def save_visit_adjustments(self, visit_id, brightness, contrast, saturation, shading, auto):
+        return self.call('save_visit_adjustments', visit_id, brightness, contrast, saturation, shading, auto)
+
+    def get_visit_adjustments(self, visit_id):
+        return self.call('get_visit_adjustments', visit_id)
+
+    def add_visit_image(self, visit_id, camera, image_path, skew_ms):
+        return self.call('add_visit_image', visit_id, camera, normalize_store_path(image_path), skew_ms)
+
+    def get_visit_images(self, visit_id):
+        return self.call('get_visit_images', visit_id)
+
+    def bulk_import(self, records):
+        self.customers = None
+        return self.call('bulk_import', records)
+
+    def file_url(self, path):
+        return '/files/' + urllib.parse.quote(normalize_store_path(path))
+
+    def cache_path(self, path):
+        key = hashlib.sha1(normalize_store_path(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + os.path.splitext(path)[1])
+
+    def remember_etag(self, cached_path, etag):
+        with open(cached_path + '.etag', 'w', encoding='utf-8') as etag_file:
+            etag_file.write(etag)
+
+    def stream_to_file(self, response, path, mode):
+        received = 0
+        with open(path, mode) as target:
+            try:
+                while True:
+                    chunk = response.read(TRANSFER_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    received += len(chunk)
+            except (http.client.HTTPException, OSError):
+                # Drop the broken connection; the caller resumes with a byte range
+                self.local.connection = None
+        return received
+
+    def fetch(self, path):
+        cached_path = self.cache_path(path)
+        headers = {}
+        if os.path.exists(cached_path) and os.path.exists(cached_path + '.etag'):
+            with open(cached_path + '.etag', 'r', encoding='utf-8') as etag_file:
+                headers['If-None-Match'] = etag_file.read()
+
+        response = self.request('GET', self.file_url(path), headers=headers)
+        if response.status == 304:
+            response.read()
+            return cached_path
+        if response.status != 200:
+            response.read()
+            return None
+
+        etag = response.getheader('ETag')
+        total = int(response.getheader('Content-Length'))
+        partial_path = cached_path + '.part'
+        received = self.stream_to_file(response, partial_path, 'wb')
+        for _ in range(REMOTE_RESUME_ATTEMPTS):
+            if received >= total:
+                break
+            response = self.request('GET', self.file_url(path), headers={'Range': f'bytes={received}-'})
+            if response.status != 206 or response.getheader('ETag') != etag:
+                response.read()
+                raise RemoteStorageError(f"{path} changed on the server during the download.")
+            received += self.stream_to_file(response, partial_path, 'ab')
+        if received < total:
+            raise RemoteStorageError(f"Download of {path} was interrupted.")
+        os.replace(partial_path, cached_path)
+        self.remember_etag(cached_path, etag)
+        return cached_path
+
+    def load_image(self, path):
+        cached_path = self.fetch(path) if path else None
+        return cv2.imread(cached_path) if cached_path else None
+
+    def upload(self, path, body, length):
+        response = self.request('PUT', self.file_url(path), body, {'Content-Length': str(length)})
+        stamp = self.read_result(response)
+        self.remember_etag(self.cache_path(path), f'"{stamp}"')
+        return stamp
+
+    def store_image(self, path, image):
+        success, encoded = cv2.imencode(os.path.splitext(path)[1] or '.png', image)
+        if not success:
+            return False
+        # Keep the cache in step so the image is not downloaded right back
+        cached_path = self.cache_path(path)
+        encoded.tofile(cached_path)
+        self.upload(path, encoded.tobytes(), encoded.size)
+        return True
+
+    def image_stamp(self, path):
+        if not path:
+            return None
+        response = self.request('HEAD', self.file_url(path))
+        response.read()
+        if response.status != 200:
+            return None
+        return response.getheader('ETag', '').strip('"')
+
+    def staging_path(self, path):
+        return self.cache_path(path)
+
+    def store_file(self, path, local_path):
+        with open(local_path, 'rb') as local_file:
+            self.upload(path, local_file, os.path.getsize(local_path))
+
+    def delete_file(self, path):
+        self.read_result(self.request('DELETE', self.file_url(path)))
+        cached_path = self.cache_path(path)
+        for stale_path in (cached_path, cached_path + '.etag'):
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
+
+    def local_file(self, path):
+        return self.fetch(path)
+
+def storage_settings():
+    # settings.conf: "storage": {"mode": "remote", "url": "http://host:8765", "token": "..."}
+    return load_settings().get('storage', {})
+
+def create_backend():
+    storage = storage_settings()
+    if storage.get('mode') == 'remote':
+        return RemoteBackend(storage['url'], storage.get('token'))
+    return DatabaseManager()
+
+# Settings
+SETTINGS_PATH = 'settings.conf'
+
+def load_settings():
+    try:
+        with open(SETTINGS_PATH, 'r', encoding='utf-8') as settings_file:
+            return json.load(settings_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_settings(settings):
+    with open(SETTINGS_PATH, 'w', encoding='utf-8') as settings_file:
+        json.dump(settings, settings_file)
+
+# Capture Mask
+# Everything outside the white part of the mask ends up black, so the pipeline only
+# processes the mask's bounding rectangle and pastes it into a zeroed frame at the end.
+MASK_PATH = 'mask.jpg'
+_mask_cache = {}
+
+class MaskRegion:
+    def __init__(self, mask):
+        self.mask = mask
+        self.height, self.width = mask.shape[:2]
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            # Nothing visible: keep the whole frame, compose() blacks it out
+            x, y, w, h = 0, 0, self.width, self.height
+        self.rect = (x, y, w, h)
+        self.slices = (slice(y, y + h), slice(x, x + w))
+        self.roi_mask = np.ascontiguousarray(mask[self.slices])
+        # A fully white rectangle needs no per-pixel masking
+        self.solid = cv2.countNonZero(self.roi_mask) == w * h
+
+    def crop(self, image):
+        return image[self.slices]
+
+    def compose(self, roi):
+        # Full-size image with the masked region in the rectangle and black around it
+        final = np.zeros((self.height, self.width) + roi.shape[2:], dtype=roi.dtype)
+        final[self.slices] = roi if self.solid else cv2.bitwise_and(roi, roi, mask=self.roi_mask)
+        return final
+
+def load_mask_region(width, height):
+    # Thresholded mask resized to the given frame size, loaded once per size
+    key = (width, height)
+    if key not in _mask_cache:
+        mask = cv2.imread(MASK_PATH, cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            return None
+        mask = cv2.resize(mask, (width, height))
+        _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+        _mask_cache[key] = MaskRegion(mask)
+    return _mask_cache[key]
+
+def load_capture_mask(width, height):
+    region = load_mask_region(width, height)
+    return region.mask if region is not None else None
+
+# Auto Enhance
+# Slider values are derived from the luminance histogram of the masked foot region,
+# sampled on a strided view of the image: a percentile stretch gives contrast and
+# brightness, and the gamma that moves the stretched median to mid-grey gives shading.
+AUTO_ENHANCE_SAMPLE_SIDE = 480
+AUTO_ENHANCE_CLIP = 0.01
+AUTO_ENHANCE_TARGET_LOW = 12
+AUTO_ENHANCE_TARGET_HIGH = 243
+
+def compute_auto_enhance(image):
+    height, width = image.shape[:2]
+    step = max(1, round(max(height, width) / AUTO_ENHANCE_SAMPLE_SIDE))
+    sample = np.ascontiguousarray(image[::step, ::step])
+    gray = cv2.cvtColor(sample, cv2.COLOR_BGR2GRAY)
+    mask = load_capture_mask(gray.shape[1], gray.shape[0])
+
+    histogram = cv2.calcHist([gray], [0], mask, [256], [0, 256]).ravel()
+    total = histogram.sum()
+    if total == 0:
+        return None
+    cumulative = np.cumsum(histogram) / total
+    low = int(np.searchsorted(cumulative, AUTO_ENHANCE_CLIP))
+    high = int(np.searchsorted(cumulative, 1.0 - AUTO_ENHANCE_CLIP))
+    median = int(np.searchsorted(cumulative, 0.5))
+
+    # Same model as ImageEditDialog.apply_filters: alpha = 1 + contrast / 100, beta = brightness
+    alpha = (AUTO_ENHANCE_TARGET_HIGH - AUTO_ENHANCE_TARGET_LOW) / max(high - low, 1)
+    alpha = min(max(alpha, 0.0), 2.0)
+    beta = min(max(AUTO_ENHANCE_TARGET_LOW - alpha * low, -100), 100)
+
+    stretched_median = min(max(alpha * median + beta, 1), 254) / 255.0
+    gamma = math.log(stretched_median) / math.log(0.5)
+    return {
+        'brightness': int(round(beta)),
+        'contrast': int(round((alpha - 1.0) * 100)),
+        'shading': int(round(min(max(gamma, 0.5), 2.0) * 100)),
+    }
+
+# Session Recorder
+# Composited preview frames are handed to an encoder thread through a bounded queue.
+# When the encoder falls behind, new frames are dropped and counted instead of
+# blocking update_frame, so the preview keeps its frame rate. Frames are stamped when
+# they are submitted and the video is written at a constant RECORDING_FPS: the previous
+# frame is repeated over gaps (dropped frames, or a camera slower than RECORDING_FPS),
+# so the video plays in real time and lasts as long as the recording did.
+RECORDING_FPS = 30
+RECORDING_QUEUE_SIZE = 32
+RECORDING_MAX_SECONDS = 120
+
+class SessionRecorder:
+    def __init__(self, path, fps=RECORDING_FPS, queue_size=RECORDING_QUEUE_SIZE):
+        self.path = path
+        self.fps = fps
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.frames_submitted = 0
+        self.frames_written = 0
+        self.frames_repeated = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0
+        self.error = None
+        self.started = time.monotonic()
+        self.duration = 0.0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def submit(self, frame):
+        # Never blocks: the caller must not modify the frame afterwards
+        self.frames_submitted += 1
+        try:
+            self.frames.put_nowait((time.monotonic(), frame))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def video_frames(self):
+        return self.frames_written + self.frames_repeated
+
+    def fill_until(self, writer, frame, seconds):
+        # Repeat `frame` until the video reaches `seconds` after the start
+        while self.video_frames() < int(seconds * self.fps):
+            writer.write(frame)
+            self.frames_repeated += 1
+
+    def run(self):
+        writer = None
+        previous = None
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            stamp, frame = item
+            if writer is None:
+                # Open the writer lazily so the frame size is known and the GUI thread never waits for it
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
+                if not writer.isOpened():
+                    self.error = f"Unable to open video writer for {self.path}."
+                    break
+            # A camera faster than the video rate would stretch the video; keep one frame per slot
+            if int((stamp - self.started) * self.fps) < self.video_frames():
+                self.frames_skipped += 1
+                previous = frame
+                continue
+            if previous is not None:
+                self.fill_until(writer, previous, stamp - self.started)
+            writer.write(frame)
+            self.frames_written += 1
+            previous = frame
+        if writer is not None:
+            if previous is not None and not self.error:
+                # Hold the last frame until the moment the recording was stopped
+                self.fill_until(writer, previous, self.duration)
+            writer.release()
+
+    def stop(self):
+        self.duration = self.elapsed()
+        # Wait for the queue to drain; give up once the encoder thread is gone
+        while self.thread.is_alive():
+            try:
+                self.frames.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.thread.join()
+
+# Temporal Noise Reduction
+# A running weighted average of the live frames is kept in a preallocated float buffer,
+# so a denoised still is available the moment capture is pressed. A cheap frame-to-frame
+# difference on a thumbnail detects patient movement and restarts the average.
+DENOISE_ALPHA = 0.25
+DENOISE_MOTION_THRESHOLD = 6.0
+DENOISE_MOTION_SIZE = (80, 60)
+
+class FrameAccumulator:
+    def __init__(self, alpha=DENOISE_ALPHA, motion_threshold=DENOISE_MOTION_THRESHOLD):
+        self.alpha = alpha
+        self.motion_threshold = motion_threshold
+        self.average = None
+        self.thumbnail = None
+        self.previous_thumbnail = None
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+    def add(self, frame):
+        if self.average is None or self.average.shape != frame.shape:
+            self.average = np.empty(frame.shape, dtype=np.float32)
+            self.thumbnail = np.empty(DENOISE_MOTION_SIZE[::-1], dtype=np.uint8)
+            self.previous_thumbnail = np.empty_like(self.thumbnail)
+            self.count = 0
+
+        # Motion check against the previous frame on a small grayscale thumbnail
+        self.thumbnail, self.previous_thumbnail = self.previous_thumbnail, self.thumbnail
+        cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), DENOISE_MOTION_SIZE, dst=self.thumbnail,
+                   interpolation=cv2.INTER_AREA)
+        if self.count and cv2.norm(self.thumbnail, self.previous_thumbnail, cv2.NORM_L1) / self.thumbnail.size > self.motion_threshold:
+            self.count = 0
+
+        if self.count == 0:
+            self.average[...] = frame
+        else:
+            cv2.accumulateWeighted(frame, self.average, self.alpha)
+        self.count += 1
+
+    def result(self):
+        return cv2.convertScaleAbs(self.average)
+
+# Image Registration
+# Captures are aligned on downscaled grayscale copies (coarse-to-fine ECC, ORB homography
+# as fallback); the resulting 3x3 matrix is rescaled to full resolution and maps
+# reference pixel coordinates to moving image coordinates.
+REGISTRATION_MAX_SIDE = 640
+REGISTRATION_LEVELS = 3
+
+def image_stamp(path):
+    # Cheap change detector for cached results derived from an image file
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+def _registration_gray(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = min(1.0, REGISTRATION_MAX_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+def _ecc_pyramid(reference, moving):
+    reference_levels = [reference]
+    moving_levels = [moving]
+    for _ in range(REGISTRATION_LEVELS - 1):
+        reference_levels.append(cv2.pyrDown(reference_levels[-1]))
+        moving_levels.append(cv2.pyrDown(moving_levels[-1]))
+
+    warp = np.eye(2, 3, dtype=np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+    for level in reversed(range(REGISTRATION_LEVELS)):
+        if level != REGISTRATION_LEVELS - 1:
+            # Carry the coarser estimate to the next finer level
+            warp[:, 2] *= 2
+        template = reference_levels[level]
+        # Ignore the black border left by the podoscope mask
+        _, template_mask = cv2.threshold(template, 0, 255, cv2.THRESH_BINARY)
+        _, warp = cv2.findTransformECC(template, moving_levels[level], warp, cv2.MOTION_EUCLIDEAN,
+                                       criteria, template_mask, 5)
+    return np.vstack([warp, [0, 0, 1]]).astype(np.float64)
+
+def _feature_homography(reference, moving):
+    orb = cv2.ORB_create(1000)
+    reference_points, reference_descriptors = orb.detectAndCompute(reference, None)
+    moving_points, moving_descriptors = orb.detectAndCompute(moving, None)
+    if reference_descriptors is None or moving_descriptors is None:
+        return None
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+    matches = sorted(matcher.match(reference_descriptors, moving_descriptors), key=lambda m: m.distance)[:200]
+    if len(matches) < 10:
+        return None
+    source = np.float32([reference_points[m.queryIdx].pt for m in matches])
+    target = np.float32([moving_points[m.trainIdx].pt for m in matches])
+    homography, _ = cv2.findHomography(source, target, cv2.RANSAC, 3.0)
+    return homography
+
+def register_images(reference, moving):
+    reference_gray, reference_scale = _registration_gray(reference)
+    moving_gray, moving_scale = _registration_gray(moving)
+
+    method = 'ecc'
+    try:
+        if reference_gray.shape != moving_gray.shape:
+            raise cv2.error("size mismatch")
+        warp = _ecc_pyramid(reference_gray, moving_gray)
+    except cv2.error:
+        method = 'orb'
+        warp = _feature_homography(reference_gray, moving_gray)
+    if warp is None:
+        return 'identity', np.eye(3)
+
+    # Lift the warp from the downscaled copies back to full resolution
+    reference_to_small = np.diag([reference_scale, reference_scale, 1.0])
+    small_to_moving = np.diag([1.0 / moving_scale, 1.0 / moving_scale, 1.0])
+    return method, small_to_moving @ warp @ reference_to_small
+
+def warp_to_reference(reference, moving, matrix):
+    height, width = reference.shape[:2]
+    return cv2.warpPerspective(moving, matrix, (width, height), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP)
+
+def cv_to_pixmap(image):
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    height, width, channel = image.shape
+    bytesPerLine = channel * width
+    q_img = QtGui.QImage(image.data, width, height, bytesPerLine, QtGui.QImage.Format_RGB888)
+    return QtGui.QPixmap.fromImage(q_img)
+
+# Tiled Image Viewer
+# Full-resolution captures are shown through a lazily built image pyramid. Only the
+# tiles intersecting the viewport are converted to pixmaps, and the most recently
+# used ones are kept in an LRU cache, so panning and zooming never rescale the whole image.
+TILE_SIZE = 256
+TILE_CACHE_SIZE = 192
+
+class ImagePyramid:
+    def __init__(self, image):
+        self.levels = [image]
+        self.tiles = OrderedDict()
+
+    @property
+    def width(self):
+        return self.levels[0].shape[1]
+
+    @property
+    def height(self):
+        return self.levels[0].shape[0]
+
+    def level(self, index):
+        while len(self.levels) <= index:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+        return self.levels[index]
+
+    def level_for_zoom(self, zoom):
+        # Pick the smallest level that still has at least one pixel per screen pixel
+        if zoom >= 1.0:
+            return 0
+        index = int(math.floor(math.log2(1.0 / zoom)))
+        while index > 0 and min(self.height, self.width) >> index < 1:
+            index -= 1
+        return index
+
+    def level_scale(self, index):
+        return self.level(index).shape[1] / self.width
+
+    def tile(self, index, column, row):
+        key = (index, column, row)
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+            return pixmap
+
+        level = self.level(index)
+        tile = level[row * TILE_SIZE:(row + 1) * TILE_SIZE, column * TILE_SIZE:(column + 1) * TILE_SIZE]
+        pixmap = cv_to_pixmap(tile)
+        self.tiles[key] = pixmap
+        if len(self.tiles) > TILE_CACHE_SIZE:
+            self.tiles.popitem(last=False)
+        return pixmap
+
+class TiledImageView(QtWidgets.QWidget):
+    MAX_ZOOM = 8.0
+    ZOOM_STEP = 1.25
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pyramid = None
+        self.zoom = 1.0
+        # Image coordinate shown at the top-left corner of the widget
+        self.offset = QtCore.QPointF(0, 0)
+        self.fit_to_view = True
+        self.drag_origin = None
+        self.setMinimumSize(640, 480)
+        self.setCursor(QtCore.Qt.OpenHandCursor)
+        self.setToolTip("Koliesko: priblíženie, ťahanie: posun, dvojklik: celý obrázok")
+
+    def set_image(self, image):
+        # Keep the current zoom and position when the image is only re-filtered
+        same_size = self.pyramid is not None and (self.pyramid.height, self.pyramid.width) == image.shape[:2]
+        self.pyramid = ImagePyramid(image)
+        if not same_size:
+            self.fit_to_view = True
+        self.update()
+
+    def fit_zoom(self):
+        return min(self.width() / self.pyramid.width, self.height() / self.pyramid.height)
+
+    def apply_fit(self):
+        self.zoom = self.fit_zoom()
+        self.offset = QtCore.QPointF((self.pyramid.width - self.width() / self.zoom) / 2,
+                                     (self.pyramid.height - self.height() / self.zoom) / 2)
+
+    def clamp_offset(self):
+        # Keep at least half of the viewport over the image
+        half_width = self.width() / self.zoom / 2
+        half_height = self.height() / self.zoom / 2
+        self.offset.setX(min(max(self.offset.x(), -half_width), self.pyramid.width - half_width))
+        self.offset.setY(min(max(self.offset.y(), -half_height), self.pyramid.height - half_height))
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor('#2e2e2e'))
+        if self.pyramid is None:
+            return
+        if self.fit_to_view:
+            self.apply_fit()
+
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+        index = self.pyramid.level_for_zoom(self.zoom)
+        scale = self.pyramid.level_scale(index)
+        level = self.pyramid.level(index)
+        level_height, level_width = level.shape[:2]
+
+        # Visible area in level coordinates
+        left = max(0.0, self.offset.x() * scale)
+        top = max(0.0, self.offset.y() * scale)
+        right = min(level_width, (self.offset.x() + self.width() / self.zoom) * scale)
+        bottom = min(level_height, (self.offset.y() + self.height() / self.zoom) * scale)
+        if right <= left or bottom <= top:
+            return
+
+        factor = self.zoom / scale
+        for row in range(int(top) // TILE_SIZE, (int(math.ceil(bottom)) - 1) // TILE_SIZE + 1):
+            for column in range(int(left) // TILE_SIZE, (int(math.ceil(right)) - 1) // TILE_SIZE + 1):
+                pixmap = self.pyramid.tile(index, column, row)
+                # Round both edges so neighbouring tiles share a border without seams
+                x0 = round((column * TILE_SIZE - self.offset.x() * scale) * factor)
+                y0 = round((row * TILE_SIZE - self.offset.y() * scale) * factor)
+                x1 = round((column * TILE_SIZE + pixmap.width() - self.offset.x() * scale) * factor)
+                y1 = round((row * TILE_SIZE + pixmap.height() - self.offset.y() * scale) * factor)
+                painter.drawPixmap(QtCore.QRect(x0, y0, x1 - x0, y1 - y0), pixmap)
+
+    def wheelEvent(self, event):
+        if self.pyramid is None:
+            return
+        if self.fit_to_view:
+            self.apply_fit()
+            self.fit_to_view = False
+        position = QtCore.QPointF(event.pos())
+        anchor = self.offset + position / self.zoom
+        zoom = self.zoom * self.ZOOM_STEP ** (event.angleDelta().y() / 120)
+        self.zoom = min(max(zoom, self.fit_zoom() / 2), self.MAX_ZOOM)
+        # Zoom around the cursor
+        self.offset = anchor - position / self.zoom
+        self.clamp_offset()
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton and self.pyramid is not None:
+            self.drag_origin = event.pos()
+            self.setCursor(QtCore.Qt.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_origin is None:
+            return
+        if self.fit_to_view:
+            self.apply_fit()
+            self.fit_to_view = False
+        delta = event.pos() - self.drag_origin
+        self.drag_origin = event.pos()
+        self.offset -= QtCore.QPointF(delta) / self.zoom
+        self.clamp_offset()
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_origin = None
+        self.setCursor(QtCore.Qt.OpenHandCursor)
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit_to_view = True
+        self.update()
+
+# Import / Export
+# Import reads CSV or JSONL rows (one customer per row, optionally with one visit),
+# validates them and hands them to bulk_import, which writes everything with
+# executemany in a single transaction. Export writes customers.jsonl, visits.jsonl and
+# the visit files into a ZIP or tar archive; files are copied from disk in chunks by
+# zipfile/tarfile and never read into memory. Both run in a DataTransferWorker.
+IMPORT_FIELDS = ['first_name', 'last_name', 'age', 'phone', 'email', 'date', 'image_path', 'note']
+IMPORT_ERROR_LIMIT = 20
+
+def customer_key(first_name, last_name, phone, email):
+    # Duplicate detection: same name and same phone digits (or e-mail when there is no phone)
+    contact = ''.join(character for character in (phone or '') if character.isdigit()) or (email or '').strip().lower()
+    return ((first_name or '').strip().lower(), (last_name or '').strip().lower(), contact)
+
+def read_import_rows(path):
+    if path.lower().endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as import_file:
+            for line_number, line in enumerate(import_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+    else:
+        with open(path, 'r', newline='', encoding='utf-8-sig') as import_file:
+            # Line 1 is the header
+            for line_number, row in enumerate(csv.DictReader(import_file), start=2):
+                yield line_number, row
+
+def validate_import_rows(rows, progress=None, cancelled=None):
+    # Returns (records, rejected rows, visits left out); the last two are messages
+    records = []
+    errors = []
+    skipped_visits = []
+    for count, (line_number, row) in enumerate(rows, start=1):
+        if cancelled is not None and cancelled():
+            return None, errors, skipped_visits
+        if progress is not None and count % 500 == 0:
+            progress(count, 0, f"Kontrola záznamov ({count})")
+        if not isinstance(row, dict):
+            errors.append(f"Riadok {line_number}: neplatný formát.")
+            continue
+        # JSONL values may be numbers; 0 is a value, only a missing field is empty
+        values = {field: str(row[field] if row.get(field) is not None else '').strip() for field in IMPORT_FIELDS}
+        if not values['first_name'] or not values['last_name']:
+            errors.append(f"Riadok {line_number}: meno a priezvisko sú povinné.")
+            continue
+        age = None
+        if values['age']:
+            try:
+                age = int(float(values['age']))
+            except (ValueError, OverflowError):
+                age = -1
+            if not 0 <= age <= 120:
+                errors.append(f"Riadok {line_number}: neplatný vek '{values['age']}'.")
+                continue
+        date, date_epoch = None, None
+        if values['date']:
+            date_epoch = date_to_epoch(values['date'])
+            if date_epoch is None:
+                errors.append(f"Riadok {line_number}: neplatný dátum '{values['date']}'.")
+                continue
+            # Store dates in the format the application writes itself
+            date = datetime.fromtimestamp(date_epoch).strftime(DATE_FORMAT)
+        if not values['image_path'] and (values['date'] or values['note']):
+            # Every visit shows its image, so the customer is imported without the visit
+            skipped_visits.append(f"Riadok {line_number}: vizita bez obrázka nebola importovaná.")
+            date, date_epoch, values['note'] = None, None, ''
+        records.append({
+            'first_name': values['first_name'],
+            'last_name': values['last_name'],
+            'age': age,
+            'phone': values['phone'],
+            'email': values['email'],
+            'date': date,
+            'date_epoch': date_epoch,
+            'image_path': normalize_store_path(values['image_path']) if values['image_path'] else None,
+            'note': values['note'],
+        })
+    return records, errors, skipped_visits
+
+def import_file(backend, path, progress, cancelled):
+    progress(0, 0, "Načítavanie súboru")
+    records, errors, skipped_visits = validate_import_rows(read_import_rows(path), progress, cancelled)
+    if records is None:
+        return None
+    progress(0, 0, f"Zápis {len(records)} záznamov do databázy")
+    stats = backend.bulk_import(records) if records else {}
+    stats['rows_rejected'] = len(errors)
+    stats['visits_skipped'] = len(skipped_visits)
+    stats['errors'] = (errors + skipped_visits)[:IMPORT_ERROR_LIMIT]
+    return stats
+
+class ArchiveWriter:
+    def __init__(self, path):
+        self.zip_file = None
+        self.tar_file = None
+        if path.lower().endswith('.zip'):
+            self.zip_file = zipfile.ZipFile(path, 'w', allowZip64=True)
+        else:
+            self.tar_file = tarfile.open(path, 'w:gz' if path.lower().endswith(('.tar.gz', '.tgz')) else 'w')
+
+    def add_bytes(self, name, data):
+        if self.zip_file is not None:
+            self.zip_file.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time()
+            self.tar_file.addfile(info, io.BytesIO(data))
+
+    def add_file(self, name, local_path):
+        if self.zip_file is not None:
+            # PNG and MP4 are already compressed; storing them avoids a second pointless pass
+            self.zip_file.write(local_path, name, compress_type=zipfile.ZIP_STORED)
+        else:
+            self.tar_file.add(local_path, arcname=name)
+
+    def close(self):
+        if self.zip_file is not None:
+            self.zip_file.close()
+        else:
+            self.tar_file.close()
+
+def export_archive(backend, archive_path, customer_ids, progress, cancelled):
+    customers = backend.get_all_customers()
+    if customer_ids:
+        customers = [customer for customer in customers if customer['id'] in customer_ids]
+    stats = {'customers': 0, 'visits': 0, 'files': 0, 'missing_files': 0}
+    customer_lines = []
+    visit_lines = []
+    archive = ArchiveWriter(archive_path)
+    try:
+        for count, customer in enumerate(customers, start=1):
+            if cancelled():
+                return None
+            progress(count - 1, len(customers), f"{customer['first_name']} {customer['last_name']}")
+            customer_lines.append(json.dumps(dict(customer), ensure_ascii=False))
+            stats['customers'] += 1
+
+            for visit in backend.get_visits_by_customer_id(customer['id']):
+                record = dict(visit)
+                paths = [('image', visit['image_path'])]
+                paths += [(f"camera_{visit_image['camera']}", visit_image['image_path'])
+                          for visit_image in backend.get_visit_images(visit['id'])]
+                paths += [('recording', recording['video_path'])
+                          for recording in backend.get_recordings_by_visit_id(visit['id'])]
+                record['files'] = {}
+                for role, path in paths:
+                    local_path = backend.local_file(path) if path else None
+                    if local_path is None:
+                        stats['missing_files'] += 1
+                        continue
+                    name = f"files/{customer['id']}/{visit['id']}_{os.path.basename(normalize_store_path(path))}"
+                    archive.add_file(name, local_path)
+                    record['files'][role] = name
+                    stats['files'] += 1
+                visit_lines.append(json.dumps(record, ensure_ascii=False))
+                stats['visits'] += 1
+
+        # The record files are small text, written last once all visits are known
+        archive.add_bytes('customers.jsonl', ('\n'.join(customer_lines) + '\n').encode('utf-8'))
+        archive.add_bytes('visits.jsonl', ('\n'.join(visit_lines) + '\n').encode('utf-8'))
+    finally:
+        archive.close()
+        if cancelled():
+            os.remove(archive_path)
+    progress(len(customers), len(customers), "Hotovo")
+    return stats
+
+class DataTransferWorker(QtCore.QThread):
+    progress = QtCore.pyqtSignal(int, int, str)
+    completed = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, task, *args):
+        super().__init__()
+        self.task = task
+        self.args = args
+        self.cancelled = False
+
+    def run(self):
+        try:
+            # SQLite connections belong to one thread, so the worker opens its own backend
+            backend = create_backend()
+            result = self.task(backend, *self.args, progress=self.progress.emit, cancelled=lambda: self.cancelled)
+        except Exception as error:
+            self.failed.emit(str(error))
+            return
+        self.completed.emit(result)
+
+class DataTransferDialog(QtWidgets.QProgressDialog):
+    def __init__(self, parent, title, task, *args):
+        super().__init__(title, "Zrušiť", 0, 0, parent)
+        self.setWindowTitle(title)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.result = None
+        self.worker = DataTransferWorker(task, *args)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.completed.connect(self.on_completed)
+        self.worker.failed.connect(self.on_failed)
+        self.finished_work = False
+        # Cancel only asks the worker to stop; the dialog stays open until the worker has
+        # finished, so the result reports what was actually done
+        self.canceled.disconnect()
+        self.canceled.connect(self.cancel_transfer)
+
+    def run(self):
+        self.worker.start()
+        self.exec_()
+        self.worker.wait()
+        return self.result
+
+    def update_progress(self, done, total, message):
+        self.setMaximum(total)
+        self.setValue(done)
+        self.setLabelText(message)
+
+    def cancel_transfer(self):
+        self.worker.cancelled = True
+        self.setLabelText("Rušenie...")
+        self.findChild(QtWidgets.QPushButton).setEnabled(False)
+
+    def reject(self):
+        # Escape and the window close button cancel like the button does
+        if not self.finished_work:
+            self.cancel_transfer()
+            return
+        super().reject()
+
+    def on_completed(self, result):
+        self.finished_work = True
+        self.result = result
+        self.accept()
+
+    def on_failed(self, message):
+        self.finished_work = True
+        QtWidgets.QMessageBox.critical(self, "Chyba", message)
+        self.reject()
+
+# Gallery Consistency
+# file_index remembers size, mtime and hash of every file under GALLERY_DIR. A check
+# walks the Gallery with os.scandir and only hashes files whose size or mtime changed
+# since the last run, so repeated checks of a large Gallery cost one stat per file.
+# The index is then compared with the paths stored in the database. The check needs the
+# Gallery on this computer, so with remote storage it is run on the server workstation.
+# Files written shortly before the check (a capture saved just before its visit row,
+# a recording still being encoded) are never reported or removed as orphans.
+INDEX_COMMIT_INTERVAL = 200
+ORPHAN_GRACE_SECONDS = 60
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as indexed_file:
+        for chunk in iter(lambda: indexed_file.read(TRANSFER_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def scan_files(directory):
+    # Yields (path, stat) of every file below directory; paths use '/' like the store
+    pending = [directory]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and not entry.name.endswith('.part'):
+                        yield normalize_store_path(entry.path), entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+
+def path_key(path):
+    # Stored paths may use either separator, and Windows ignores case
+    return os.path.normcase(os.path.normpath(normalize_store_path(path)))
+
+def settled_file(path, busy_keys, cutoff_ns):
+    # False for files in use or modified after cutoff_ns, which may not be in the database yet
+    if path_key(path) in busy_keys:
+        return False
+    try:
+        return os.stat(path).st_mtime_ns < cutoff_ns
+    except FileNotFoundError:
+        return True
+
+def orphan_cutoff_ns():
+    return time.time_ns() - ORPHAN_GRACE_SECONDS * 1_000_000_000
+
+def reconcile_gallery(backend, busy_paths, progress, cancelled):
+    # busy_paths are files the application is writing right now (e.g. the active recording)
+    if not isinstance(backend, DatabaseManager):
+        raise RemoteStorageError("Kontrolu galérie spustite na počítači so zdieľaným úložiskom.")
+    cutoff_ns = orphan_cutoff_ns()
+    busy_keys = {path_key(path) for path in busy_paths}
+    progress(0, 0, "Prehľadávanie galérie")
+    index = backend.get_file_index()
+    files = {}
+    changed = []
+    for path, stat in scan_files(GALLERY_DIR):
+        if cancelled():
+            return None
+        files[path] = stat
+        indexed = index.get(path)
+        if indexed is None or indexed['size'] != stat.st_size or indexed['mtime_ns'] != stat.st_mtime_ns:
+            changed.append(path)
+
+    # Hashes are committed in batches, so a cancelled check keeps the work already done
+    removed = [path for path in index if path not in files]
+    entries = []
+    for count, path in enumerate(changed, start=1):
+        if cancelled():
+            backend.update_file_index(entries, removed)
+            return None
+        progress(count - 1, len(changed), f"Kontrola súborov ({count}/{len(changed)})")
+        try:
+            entries.append((path, files[path].st_size, files[path].st_mtime_ns, file_hash(path)))
+        except OSError:
+            files.pop(path)
+        if len(entries) >= INDEX_COMMIT_INTERVAL:
+            backend.update_file_index(entries, removed)
+            entries, removed = [], []
+    backend.update_file_index(entries, removed)
+    index = backend.get_file_index()
+
+    indexed = {path_key(path) for path in index}
+    referenced = set()
+    missing = []
+    for kind, visit_id, path in backend.get_referenced_files():
+        key = path_key(path)
+        referenced.add(key)
+        if key not in indexed and not os.path.exists(normalize_store_path(path)):
+            missing.append({'kind': kind, 'visit_id': visit_id, 'path': path})
+
+    hashes = {}
+    for path, row in index.items():
+        hashes.setdefault(row['hash'], []).append(path)
+    progress(len(changed), len(changed), "Hotovo")
+    return {
+        'files': len(index),
+        'hashed': len(changed),
+        'orphaned_files': sorted(path for path in index
+                                 if path_key(path) not in referenced and settled_file(path, busy_keys, cutoff_ns)),
+        'missing': missing,
+        'duplicates': sorted(sorted(paths) for paths in hashes.values() if len(paths) > 1),
+        'orphaned_visits': [dict(visit) for visit in backend.get_orphaned_visits()],
+    }
+
+def clean_gallery(backend, orphaned_files, orphaned_visit_ids, busy_paths, progress, cancelled):
+    # Visits go first, so the files they pointed to are not referenced any more
+    if orphaned_visit_ids:
+        backend.delete_visits(orphaned_visit_ids)
+    # Files touched since the check, or referenced again, are left alone
+    cutoff_ns = orphan_cutoff_ns()
+    busy_keys = {path_key(path) for path in busy_paths}
+    busy_keys.update(path_key(path) for _, _, path in backend.get_referenced_files())
+    removed = []
+    failed = []
+    try:
+        for count, path in enumerate(orphaned_files, start=1):
+            if cancelled():
+                break
+            progress(count - 1, len(orphaned_files), path)
+            if not settled_file(path, busy_keys, cutoff_ns):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # e.g. a file another program has open on Windows
+                failed.append(path)
+                continue
+            removed.append(path)
+    finally:
+        backend.update_file_index([], removed)
+    progress(len(orphaned_files), len(orphaned_files), "Hotovo")
+    return {'files_removed': len(removed), 'files_failed': failed, 'visits_removed': len(orphaned_visit_ids)}
+
+# Visit Reports
+# PDF reports are painted with QPdfWriter on a small thread pool; images are scaled
+# down before they are embedded. Everything the report shows (names, dates, notes,
+# filter values and image stamps) is hashed, and the PDF is cached under that hash,
+# so asking for the same report again just reopens the cached file.
+REPORT_CACHE_DIR = 'report_cache'
+REPORT_VERSION = 1
+REPORT_WORKERS = 2
+REPORT_RESOLUTION = 150
+REPORT_IMAGE_MAX_SIDE = 1200
+REPORT_THUMBNAIL_MAX_SIDE = 400
+
+def build_report(backend, visits):
+    # Collects the report content on the calling thread (database access stays there)
+    customer = backend.get_customer_by_id(visits[0]['customer_id'])
+    entries = []
+    for visit in sorted(visits, key=lambda visit: (visit['date_epoch'] or 0, visit['id'])):
+        adjustments = backend.get_visit_adjustments(visit['id'])
+        entries.append({
+            'id': visit['id'],
+            'date': visit['date'],
+            'note': visit['note'] or '',
+            'image_path': visit['image_path'],
+            'image_stamp': backend.image_stamp(visit['image_path']),
+            'adjustments': dict(adjustments) if adjustments else None,
+            'camera_images': [{'camera': visit_image['camera'], 'image_path': visit_image['image_path'],
+                               'image_stamp': backend.image_stamp(visit_image['image_path'])}
+                              for visit_image in backend.get_visit_images(visit['id'])],
+            'recordings': len(backend.get_recordings_by_visit_id(visit['id'])),
+        })
+    report = {
+        'version': REPORT_VERSION,
+        'customer': f"{customer['first_name']} {customer['last_name']}" if customer else '',
+        'visits': entries,
+    }
+    key = hashlib.sha256(json.dumps(report, sort_keys=True, default=_json_default).encode('utf-8')).hexdigest()
+    return report, key
+
+def report_image(backend, path, max_side):
+    image = backend.load_image(path) if path else None
+    if image is None:
+        return None
+    scale = min(1.0, max_side / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    height, width, channel = image.shape
+    # copy() detaches the QImage from the numpy buffer
+    return QtGui.QImage(image.data, width, height, channel * width, QtGui.QImage.Format_RGB888).copy()
+
+def draw_image_fitted(painter, image, rect):
+    size = image.size().scaled(rect.size(), QtCore.Qt.KeepAspectRatio)
+    target = QtCore.QRect(rect.x() + (rect.width() - size.width()) // 2, rect.y(), size.width(), size.height())
+    painter.drawImage(target, image)
+    return target.height()
+
+def render_report(backend, report, output_path):
+    partial_path = output_path + '.part'
+    writer = QtGui.QPdfWriter(partial_path)
+    writer.setPageSize(QtGui.QPageSize(QtGui.QPageSize.A4))
+    writer.setPageMargins(QtCore.QMarginsF(15, 15, 15, 15), QtGui.QPageLayout.Millimeter)
+    writer.setResolution(REPORT_RESOLUTION)
+    writer.setTitle(f"Podoscope - {report['customer']}")
+
+    painter = QtGui.QPainter(writer)
+    try:
+        width = writer.width()
+        height = writer.height()
+        title_font = QtGui.QFont('Sans Serif', 16, QtGui.QFont.Bold)
+        text_font = QtGui.QFont('Sans Serif', 10)
+        line_height = QtGui.QFontMetrics(text_font, writer).lineSpacing()
+
+        for page, entry in enumerate(report['visits']):
+            if page:
+                writer.newPage()
+            y = 0
+            painter.setFont(title_font)
+            title_height = QtGui.QFontMetrics(title_font, writer).lineSpacing()
+            painter.drawText(QtCore.QRect(0, y, width, title_height), QtCore.Qt.AlignLeft, report['customer'])
+            y += title_height
+            painter.setFont(text_font)
+            painter.drawText(QtCore.QRect(0, y, width, line_height), QtCore.Qt.AlignLeft,
+                             f"Vizita {page + 1}/{len(report['visits'])} - {entry['date']}")
+            y += line_height * 2
+
+            # Main image takes up to half of the page, additional cameras share a row below it
+            image = report_image(backend, entry['image_path'], REPORT_IMAGE_MAX_SIDE)
+            if image is not None:
+                y += draw_image_fitted(painter, image, QtCore.QRect(0, y, width, height // 2)) + line_height
+            camera_images = [report_image(backend, camera_image['image_path'], REPORT_THUMBNAIL_MAX_SIDE)
+                             for camera_image in entry['camera_images']]
+            camera_images = [camera_image for camera_image in camera_images if camera_image is not None]
+            if camera_images:
+                tile_width = width // len(camera_images)
+                row_height = 0
+                for number, camera_image in enumerate(camera_images):
+                    row_height = max(row_height, draw_image_fitted(
+                        painter, camera_image, QtCore.QRect(number * tile_width, y, tile_width - line_height, height // 6)))
+                y += row_height + line_height
+
+            details = []
+            if entry['adjustments']:
+                adjustments = entry['adjustments']
+                details.append(f"Jas {adjustments['brightness']}, kontrast {adjustments['contrast']}, "
+                               f"saturácia {adjustments['saturation']}, tiene {adjustments['shading']}"
+                               + (" (automaticky)" if adjustments['auto'] else ""))
+            if entry['recordings']:
+                details.append(f"Nahrávky: {entry['recordings']}")
+            for detail in details:
+                painter.drawText(QtCore.QRect(0, y, width, line_height), QtCore.Qt.AlignLeft, detail)
+                y += line_height
+            if entry['note']:
+                y += line_height // 2
+                painter.drawText(QtCore.QRect(0, y, width, max(height - y, line_height)),
+                                 QtCore.Qt.AlignLeft | QtCore.Qt.TextWordWrap, entry['note'])
+    finally:
+        painter.end()
+    os.replace(partial_path, output_path)
+    return output_path
+
+class ReportGenerator(QtCore.QObject):
+    report_ready = QtCore.pyqtSignal(str, str, str)
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS)
+        self.callbacks = {}
+        os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+        # Emitted from the pool threads, delivered on the GUI thread
+        self.report_ready.connect(self.deliver)
+
+    def generate(self, visits, callback):
+        # callback(path, error) is called on the GUI thread
+        report, key = build_report(self.backend, visits)
+        output_path = os.path.join(REPORT_CACHE_DIR, f"{key}.pdf")
+        if os.path.exists(output_path):
+            callback(output_path, '')
+            return
+        if key in self.callbacks:
+            # Same report already rendering
+            self.callbacks[key].append(callback)
+            return
+        self.callbacks[key] = [callback]
+        future = self.executor.submit(render_report, self.backend, report, output_path)
+        future.add_done_callback(lambda done: self.report_ready.emit(
+            key, output_path, str(done.exception()) if done.exception() else ''))
+
+    def deliver(self, key, output_path, error):
+        for callback in self.callbacks.pop(key, []):
+            callback(output_path, error)
+
+_report_generator = None
+
+def report_generator(backend):
+    global _report_generator
+    if _report_generator is None or _report_generator.backend is not backend:
+        _report_generator = ReportGenerator(backend)
+    return _report_generator
+
+def open_report(path, error):
+    if error:
+        QtWidgets.QMessageBox.critical(None, "Chyba", f"Správu sa nepodarilo vytvoriť: {error}")
+        return
+    QtGui.QDesktopServices.openUrl(QtCore.QUrl.fromLocalFile(os.path.abspath(path)))
+
+# Cameras
+# Each camera is read on its own thread and keeps a short history of frames stamped
+# with time.monotonic() at grab(), before decoding. The preview only polls the latest
+# frame of each camera, so a slow camera never holds back the others; FrameSynchronizer
+# picks one frame per camera with the smallest timestamp spread for a capture.
+CAMERA_HISTORY = 5
+SYNC_TOLERANCE_MS = 20
+
+def camera_settings():
+    # settings.conf: "cameras": [0, 1] (first index is the plantar camera), "sync_tolerance_ms": 20
+    settings = load_settings()
+    return settings.get('cameras', [0]), settings.get('sync_tolerance_ms', SYNC_TOLERANCE_MS)
+
+class CameraStream:
+    def __init__(self, index, capture):
+        self.index = index
+        self.capture = capture
+        self.lock = threading.Lock()
+        self.history = deque(maxlen=CAMERA_HISTORY)
+        self.sequence = 0
+        self.running = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+
+    def run(self):
+        try:
+            while self.running:
+                if not self.capture.grab():
+                    time.sleep(0.01)
+                    continue
+                timestamp = time.monotonic()
+                ret, frame = self.capture.retrieve()
+                if not ret:
+                    continue
+                with self.lock:
+                    self.history.append((timestamp, frame))
+                    self.sequence += 1
+        finally:
+            # Released here, never while grab() may still be running on this thread
+            self.capture.release()
+
+    def latest(self):
+        # (sequence, frame); the sequence tells the caller whether the frame is new
+        with self.lock:
+            if not self.history:
+                return self.sequence, None
+            return self.sequence, self.history[-1][1]
+
+    def frames(self):
+        with self.lock:
+            return list(self.history)
+
+    def stop(self):
+        self.running = False
+        if self.thread.ident is None:
+            # Never started, so no thread will release the capture
+            self.capture.release()
+        elif self.thread.is_alive():
+            # A grab() blocked in the driver releases the capture once it returns
+            self.thread.join(timeout=1.0)
+
+class FrameSynchronizer:
+    def __init__(self, streams, tolerance_ms=SYNC_TOLERANCE_MS):
+        self.streams = streams
+        self.tolerance = tolerance_ms / 1000.0
+
+    def match(self):
+        # Returns (frames, skew in ms) for the newest set within tolerance, or the tightest set found
+        histories = [stream.frames() for stream in self.streams]
+        if any(not history for history in histories):
+            return None, None
+        best_frames, best_skew = None, None
+        for reference_time, reference_frame in reversed(histories[0]):
+            frames = [reference_frame]
+            timestamps = [reference_time]
+            for history in histories[1:]:
+                timestamp, frame = min(history, key=lambda entry: abs(entry[0] - reference_time))
+                frames.append(frame)
+                timestamps.append(timestamp)
+            skew = max(timestamps) - min(timestamps)
+            if best_skew is None or skew < best_skew:
+                best_frames, best_skew = frames, skew
+            if skew <= self.tolerance:
+                break
+        return best_frames, best_skew * 1000.0
+
+# Startup
+# The main window is shown first; the schema check and the (sometimes multi-second)
+# camera open run on a worker thread. Run with --startup-report to print where launch
+# time goes.
+STARTUP_REPORT_PATH = 'startup_report.txt'
+
+class StartupTimer:
+    def __init__(self, started):
+        self.started = started
+        self.marks = []
+        self.lock = threading.Lock()
+
+    def mark(self, name):
+        with self.lock:
+            if name not in (mark_name for mark_name, _ in self.marks):
+                self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self):
+        with self.lock:
+            marks = sorted(self.marks, key=lambda mark: mark[1])
+        lines = ["Startup timing (seconds since interpreter start):"]
+        previous = 0.0
+        for name, elapsed in marks:
+            lines.append(f"  {name:<24} {elapsed:8.3f}  (+{elapsed - previous:.3f})")
+            previous = elapsed
+        return "\n".join(lines)
+
+startup_timer = StartupTimer(STARTUP_STARTED)
+startup_timer.mark("imports")
+
+class StartupWorker(QtCore.QThread):
+    camera_ready = QtCore.pyqtSignal(object)
+    database_failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, camera_indices=(0,)):
+        super().__init__()
+        self.camera_indices = camera_indices
+        self.database_ready = threading.Event()
+        self.database_error = None
+        self.captures = []
+
+    def run(self):
+        try:
+            # A remote store runs its own schema check
+            if storage_settings().get('mode') != 'remote':
+                prepare_database()
+        except Exception as error:
+            self.database_error = error
+            self.database_failed.emit(str(error))
+        finally:
+            startup_timer.mark("database ready")
+            self.database_ready.set()
+
+        self.captures = [(index, cv2.VideoCapture(index)) for index in self.camera_indices]
+        startup_timer.mark("camera opened")
+        self.camera_ready.emit(self.captures)
+
 # Main Application Class
 class PodoscopeApp(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Podoscope Application")
         self.setGeometry(100, 100, 800, 600)
-        self.db_manager = DatabaseManager()
+        self._db_manager = None
+        self.camera_indices, sync_tolerance_ms = camera_settings()
+        self.streams = []
+        self.synchronizer = None
+        self.sync_tolerance_ms = sync_tolerance_ms
+        self.shown_sequences = []
+        self.current_frame_set = None
+        self.current_preview_frame = None
+        self.accumulator = FrameAccumulator()
+        self.recorder = None
+        self.recording_visit_id = None
+        self.recording_video_path = None
     
         # Apply dark theme
         self.apply_dark_theme()
 
         self.initUI()
 
+        # Schema check and camera open happen in the background
+        self.startup_worker = StartupWorker(self.camera_indices)
+        self.startup_worker.camera_ready.connect(self.on_camera_ready)
+        self.startup_worker.database_failed.connect(self.on_database_failed)
+        self.startup_worker.start()
+
+    @property
+    def db_manager(self):
+        # Created on first use, once the background schema check has finished
+        if self._db_manager is None:
+            self.startup_worker.database_ready.wait()
+            if self.startup_worker.database_error is not None:
+                # Reported by the slots like any other storage failure
+                raise StorageError(f"Databázu sa nepodarilo otvoriť: {self.startup_worker.database_error}")
+            self._db_manager = create_backend()
+        return self._db_manager
+
+    def on_database_failed(self, message):
+        # The camera preview keeps working; everything that needs the database is disabled
+        for action in self.database_actions:
+            action.setEnabled(False)
+        self.capture_button.setEnabled(False)
+        self.record_button.setEnabled(False)
+        QtWidgets.QMessageBox.critical(self, "Chyba databázy", f"Databázu sa nepodarilo otvoriť:\n{message}")
+
     def apply_dark_theme(self):
         self.setStyleSheet("""
             QDialog, QWidget {
@@ -202,12 +2407,40 @@ class PodoscopeApp(QtWidgets.QMainWindow):
         self.camera_label = QtWidgets.QLabel()
         self.camera_label.setAlignment(QtCore.Qt.AlignCenter)
         self.camera_label.setFixedSize(640, 480)
+        self.camera_label.setText("Pripájanie kamery...")
         main_layout.addWidget(self.camera_label, alignment=QtCore.Qt.AlignCenter)
 
-        # Capture Button
+        # Additional cameras, tiled below the plantar view
+        self.camera_tiles = []
+        if len(self.camera_indices) > 1:
+            tiles_layout = QtWidgets.QHBoxLayout()
+            tiles_layout.addStretch()
+            for _ in self.camera_indices[1:]:
+                tile = QtWidgets.QLabel("Pripájanie kamery...")
+                tile.setAlignment(QtCore.Qt.AlignCenter)
+                tile.setFixedSize(320, 240)
+                tiles_layout.addWidget(tile)
+                self.camera_tiles.append(tile)
+            tiles_layout.addStretch()
+            main_layout.addLayout(tiles_layout)
+
+        # Capture and Record Buttons
+        button_layout = QtWidgets.QHBoxLayout()
         self.capture_button = QtWidgets.QPushButton("Snímať")
         self.capture_button.clicked.connect(self.open_customer_selection)
-        main_layout.addWidget(self.capture_button, alignment=QtCore.Qt.AlignCenter)
+        self.capture_button.setEnabled(False)
+        self.record_button = QtWidgets.QPushButton("Nahrávať")
+        self.record_button.clicked.connect(self.toggle_recording)
+        self.record_button.setEnabled(False)
+        button_layout.addStretch()
+        button_layout.addWidget(self.capture_button)
+        button_layout.addWidget(self.record_button)
+        self.denoise_checkbox = QtWidgets.QCheckBox("Redukcia šumu")
+        self.denoise_checkbox.setToolTip("Snímka sa vytvorí priemerovaním posledných snímok kamery")
+        self.denoise_checkbox.toggled.connect(self.accumulator.reset)
+        button_layout.addWidget(self.denoise_checkbox)
+        button_layout.addStretch()
+        main_layout.addLayout(button_layout)
 
         main_widget.setLayout(main_layout)
         self.setCentralWidget(main_widget)
@@ -215,14 +2448,39 @@ class PodoscopeApp(QtWidgets.QMainWindow):
         # Menu bar
         self.create_menu()
 
-        # Start camera feed
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
+        # Camera feed timer, started once the camera is open
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.update_frame)
+
+    def on_camera_ready(self, captures):
+        primary_index, primary_capture = captures[0]
+        if not primary_capture.isOpened():
+            for index, capture in captures:
+                capture.release()
+            self.camera_label.setText("Kamera nie je dostupná.")
+            for tile in self.camera_tiles:
+                tile.setText("")
             QtWidgets.QMessageBox.critical(self, "Camera Error", "Unable to access the camera.")
             return
 
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_frame)
+        # Additional cameras that failed to open are left out of the synchronized set
+        missing = []
+        for (index, capture), tile in zip(captures[1:], self.camera_tiles):
+            if not capture.isOpened():
+                capture.release()
+                tile.setText(f"Kamera {index} nie je dostupná.")
+                missing.append(str(index))
+        if missing:
+            self.statusBar().showMessage(f"Nedostupné kamery: {', '.join(missing)}", 10000)
+
+        self.streams = [CameraStream(index, capture) for index, capture in captures if capture.isOpened()]
+        self.shown_sequences = [0] * len(self.streams)
+        self.camera_tiles = [tile for (index, capture), tile in zip(captures[1:], self.camera_tiles) if capture.isOpened()]
+        self.synchronizer = FrameSynchronizer(self.streams, self.sync_tolerance_ms)
+        for stream in self.streams:
+            stream.start()
+
+        # Start camera feed
         self.timer.start(30)
 
     def create_menu(self):
@@ -241,22 +2499,57 @@ class PodoscopeApp(QtWidgets.QMainWindow):
         list_customers_action.triggered.connect(self.list_customers)
         customers_menu.addAction(list_customers_action)
 
+        import_action = QtWidgets.QAction('Importovať...', self)
+        import_action.triggered.connect(self.import_data)
+        customers_menu.addAction(import_action)
+
+        export_action = QtWidgets.QAction('Exportovať všetko...', self)
+        export_action.triggered.connect(self.export_all_customers)
+        customers_menu.addAction(export_action)
+
         # Visits Menu Actions
         view_visits_action = QtWidgets.QAction('Zobraziť vizity', self)
         view_visits_action.triggered.connect(self.view_visits)
         visits_menu.addAction(view_visits_action)
 
+        check_gallery_action = QtWidgets.QAction('Kontrola galérie...', self)
+        check_gallery_action.triggered.connect(self.check_gallery)
+        visits_menu.addAction(check_gallery_action)
+
+        # Disabled when the database cannot be opened
+        self.database_actions = [list_customers_action, import_action, export_action,
+                                 view_visits_action, check_gallery_action]
+
         # Help Menu Actions
         about_action = QtWidgets.QAction('O aplikácii', self)
         about_action.triggered.connect(self.show_about_dialog)
         help_menu.addAction(about_action)
 
+    def update_secondary_tiles(self):
+        for number, (stream, tile) in enumerate(zip(self.streams[1:], self.camera_tiles), start=1):
+            sequence, frame = stream.latest()
+            if frame is None or sequence == self.shown_sequences[number]:
+                continue
+            self.shown_sequences[number] = sequence
+            pixmap = cv_to_pixmap(cv2.resize(frame, (tile.width(), tile.height()), interpolation=cv2.INTER_AREA))
+            tile.setPixmap(pixmap)
+
     def update_frame(self):
-        ret, frame = self.cap.read()
+        # Every camera tile shows its own newest frame; none waits for the others
+        self.update_secondary_tiles()
+        sequence, frame = self.streams[0].latest()
+        ret = frame is not None and sequence != self.shown_sequences[0]
         if ret:
+            self.shown_sequences[0] = sequence
+            if self.current_preview_frame is None and self.startup_worker.database_error is None:
+                # First frame: capture becomes possible
+                self.capture_button.setEnabled(True)
+                self.record_button.setEnabled(True)
             # Define the zoom factor (1.0 = no zoom, 1.2 = 20% zoom, etc.)
             zoom_factor = 1.2  # You can adjust this variable for different zoom levels
             self.current_frame = frame.copy()  # Ulož aktuálny rámec
+            if self.denoise_checkbox.isChecked():
+                self.accumulator.add(frame)
 
             # Get the dimensions of the original frame
             height, width, _ = frame.shape
@@ -269,45 +2562,34 @@ class PodoscopeApp(QtWidgets.QMainWindow):
             x_start = (width - new_width) // 2
             y_start = (height - new_height) // 2
 
-            # Crop the frame to the calculated area (centered on the middle)
-            cropped_frame = frame[y_start:y_start + new_height, x_start:x_start + new_width]
-
-            # Resize the cropped frame back to the original frame size (to fit the window)
-            zoomed_frame = cv2.resize(cropped_frame, (width, height))
-
-            # Load the mask (grayscale) and ensure it's properly loaded
-            mask = cv2.imread('mask.jpg', cv2.IMREAD_GRAYSCALE)
-            if mask is None:
+            # Load the mask (cached per frame size) and ensure it's properly loaded
+            region = load_mask_region(width, height)
+            if region is None:
                 QtWidgets.QMessageBox.critical(self, "Mask Error", "Unable to load the mask.")
                 return
 
-            # Resize the mask to match the original frame size (not zoomed)
-            mask = cv2.resize(mask, (width, height))
-
-            # Threshold the mask to ensure it's purely black and white
-            _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
-
-            # Invert the mask to make white areas show camera feed, black areas opaque
-            inv_mask = cv2.bitwise_not(mask)
-
-            # Create a 3-channel version of the masks to apply to the color camera feed
-            mask_rgb = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)          # Original mask (for black regions)
-            inv_mask_rgb = cv2.cvtColor(inv_mask, cv2.COLOR_GRAY2BGR)  # Inverted mask (for white regions)
-
-            # Create a completely black background (same size as the frame)
-            black_background = np.zeros_like(zoomed_frame)
-
-            # Apply the mask: show camera feed where the mask is white
-            camera_feed_visible = cv2.bitwise_and(zoomed_frame, zoomed_frame, mask=mask)
-
-            # Blacken the areas where the mask is black
-            black_areas = cv2.bitwise_and(black_background, black_background, mask=inv_mask)
-
-            # Combine the black areas and the visible camera feed (white regions show the feed, black regions are black)
-            final_frame = cv2.add(camera_feed_visible, black_areas)
-
-            # Convert the final frame to display in the GUI
-            image = cv2.cvtColor(final_frame, cv2.COLOR_BGR2RGB)
+            # Zoom only the part of the frame inside the mask's bounding rectangle; the matrix
+            # maps it the same way as cropping the centre and resizing it to the full size
+            x, y, w, h = region.rect
+            scale_x = new_width / width
+            scale_y = new_height / height
+            matrix = np.float32([[scale_x, 0, x_start + (x + 0.5) * scale_x - 0.5],
+                                 [0, scale_y, y_start + (y + 0.5) * scale_y - 0.5]])
+            zoomed_roi = cv2.warpAffine(frame, matrix, (w, h), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                        borderMode=cv2.BORDER_REPLICATE)
+
+            # Show camera feed where the mask is white, black everywhere else
+            final_frame = region.compose(zoomed_roi)
+            self.current_preview_frame = final_frame
+
+            # Hand the composited frame to the encoder thread without waiting for it
+            if self.recorder is not None:
+                self.recorder.submit(final_frame)
+                self.update_recording_status()
+
+            # Convert the final frame to display in the GUI; the border is black in RGB too
+            image = np.zeros_like(final_frame)
+            image[region.slices] = cv2.cvtColor(region.crop(final_frame), cv2.COLOR_BGR2RGB)
             height, width, channel = image.shape
             bytesPerLine = channel * width
             q_img = QtGui.QImage(image.data, width, height, bytesPerLine, QtGui.QImage.Format_RGB888)
@@ -316,14 +2598,34 @@ class PodoscopeApp(QtWidgets.QMainWindow):
             # Resize the pixmap to fit the camera label size
             pixmap = pixmap.scaled(self.camera_label.width(), self.camera_label.height(), QtCore.Qt.KeepAspectRatio)
             self.camera_label.setPixmap(pixmap)
+            startup_timer.mark("first frame")
 
 
     def open_customer_selection(self):
         # Pause the camera
         self.timer.stop()
 
+        # With several cameras, capture one frame per camera taken at (nearly) the same moment
+        self.current_frame_set = None
+        if len(self.streams) > 1:
+            frames, skew_ms = self.synchronizer.match()
+            if frames is not None:
+                self.current_frame = frames[0].copy()
+                self.current_frame_set = (frames[1:], skew_ms)
+                if skew_ms > self.sync_tolerance_ms:
+                    self.statusBar().showMessage(f"Kamery nie sú synchronizované (odchýlka {skew_ms:.0f} ms)", 5000)
+
+        # Use the averaged frame instead of the last noisy one
+        if self.denoise_checkbox.isChecked() and self.accumulator.count > 1:
+            self.current_frame = self.accumulator.result()
+
         # Open customer selection dialog
-        dialog = CustomerSelectionDialog(self.db_manager)
+        try:
+            dialog = CustomerSelectionDialog(self.db_manager)
+        except StorageError as error:
+            show_storage_error(self, error)
+            self.timer.start(30)
+            return
         if dialog.exec_():
             customer_id = dialog.get_selected_customer()
             if customer_id == -1:
@@ -349,59 +2651,174 @@ class PodoscopeApp(QtWidgets.QMainWindow):
             pass
 
     def list_customers(self):
-        dialog = ListCustomersDialog(self.db_manager)
+        try:
+            dialog = ListCustomersDialog(self.db_manager)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         dialog.exec_()
 
+    def export_all_customers(self):
+        try:
+            customers = self.db_manager.get_all_customers()
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
+        export_customers(self, customers)
+
     def save_image_and_visit(self, customer_id):
-        # Create directory if it doesn't exist
-        customer = self.db_manager.get_customer_by_id(customer_id)
-        directory = os.path.join('Gallery', f"{customer['first_name']}_{customer['last_name']}")
-        os.makedirs(directory, exist_ok=True)
+        # The storage backend creates the directory if it doesn't exist
+        try:
+            customer = self.db_manager.get_customer_by_id(customer_id)
+        except StorageError as error:
+            show_storage_error(self, error)
+            self.timer.start(30)
+            return
+        directory = os.path.join(GALLERY_DIR, f"{customer['first_name']}_{customer['last_name']}")
 
-        # Load the mask (grayscale) and ensure it's properly loaded
-        mask = cv2.imread('mask.jpg', cv2.IMREAD_GRAYSCALE)
-        if mask is None:
+        # Load the mask (cached per frame size) and ensure it's properly loaded
+        region = load_mask_region(self.current_frame.shape[1], self.current_frame.shape[0])
+        if region is None:
             QtWidgets.QMessageBox.critical(self, "Mask Error", "Unable to load the mask.")
             return
 
-        # Resize the mask to match the current frame size
-        mask = cv2.resize(mask, (self.current_frame.shape[1], self.current_frame.shape[0]))
-
-        # Threshold the mask to ensure it's purely black and white
-        _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
-
-        # Invert the mask to make white areas show camera feed, black areas opaque
-        inv_mask = cv2.bitwise_not(mask)
-
-        # Create a completely black background (same size as the frame)
-        black_background = np.zeros_like(self.current_frame)
-
-        # Apply the mask: show camera feed where the mask is white
-        camera_feed_visible = cv2.bitwise_and(self.current_frame, self.current_frame, mask=mask)
-
-        # Blacken the areas where the mask is black
-        black_areas = cv2.bitwise_and(black_background, black_background, mask=inv_mask)
-
-        # Combine the black areas and the visible camera feed
-        final_frame = cv2.add(camera_feed_visible, black_areas)
+        # Show camera feed where the mask is white, black everywhere else
+        final_frame = region.compose(region.crop(self.current_frame))
 
         # Save image with the applied mask
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         image_path = os.path.join(directory, f"customer_{timestamp}.png")
         
-        # Save the final image with the mask
-        cv2.imwrite(image_path, final_frame)
-
-        # Add visit to database
-        visit_id = self.db_manager.add_visit(customer_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), image_path, '')
+        # Every frame of the capture, with the path it is stored under
+        captures = [(image_path, final_frame)]
+        if self.current_frame_set is not None:
+            frames, skew_ms = self.current_frame_set
+            for number, frame in enumerate(frames, start=1):
+                captures.append((os.path.join(directory, f"customer_{timestamp}_cam{self.streams[number].index}.png"), frame))
+
+        try:
+            # Save the final image with the mask
+            self.db_manager.store_image(image_path, final_frame)
+
+            # Add visit to database
+            visit_id = self.db_manager.add_visit(customer_id, datetime.now().strftime(DATE_FORMAT), image_path, '')
+
+            # Store the matching frames of the additional cameras with the visit
+            for number, (camera_image_path, frame) in enumerate(captures[1:], start=1):
+                self.db_manager.store_image(camera_image_path, frame)
+                self.db_manager.add_visit_image(visit_id, self.streams[number].index, camera_image_path, skew_ms)
+        except StorageError as error:
+            # Keep a local copy of the capture instead of losing it
+            for capture_path, frame in captures:
+                unsaved_path = os.path.join(UNSAVED_CAPTURE_DIR, capture_path)
+                os.makedirs(os.path.dirname(unsaved_path), exist_ok=True)
+                cv2.imwrite(unsaved_path, frame)
+            show_storage_error(self, f"{error}\n\nSnímka je uložená v priečinku {os.path.abspath(UNSAVED_CAPTURE_DIR)}.")
+            self.timer.start(30)
+            return
 
         # Open Image Edit Dialog
-        self.image_edit_dialog = ImageEditDialog(final_frame, image_path, visit_id, self.db_manager)
+        self.image_edit_dialog = ImageEditDialog(final_frame, image_path, visit_id, self.db_manager, region)
         self.image_edit_dialog.exec_()
 
         # Resume camera
         self.timer.start(30)
 
+    def toggle_recording(self):
+        if self.recorder is not None:
+            self.stop_recording()
+        else:
+            self.start_recording()
+
+    def start_recording(self):
+        if self.current_preview_frame is None:
+            return
+        self.timer.stop()
+
+        try:
+            dialog = CustomerSelectionDialog(self.db_manager)
+            if dialog.exec_():
+                customer_id = dialog.get_selected_customer()
+                if customer_id == -1:
+                    QtWidgets.QMessageBox.information(self, "Info", "Nahrávanie je dostupné iba pre zákazníkov.")
+                elif customer_id == 0:
+                    self.add_customer_dialog()
+                else:
+                    customer = self.db_manager.get_customer_by_id(customer_id)
+                    directory = os.path.join(GALLERY_DIR, f"{customer['first_name']}_{customer['last_name']}")
+
+                    # The visit keeps a still of the first recorded frame as its image
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    image_path = os.path.join(directory, f"session_{timestamp}.png")
+                    self.db_manager.store_image(image_path, self.current_preview_frame)
+                    self.recording_visit_id = self.db_manager.add_visit(
+                        customer_id, datetime.now().strftime(DATE_FORMAT), image_path, '')
+
+                    # Encode into a local file; the backend stores it once the recording stops
+                    self.recording_video_path = os.path.join(directory, f"session_{timestamp}.mp4")
+                    self.recorder = SessionRecorder(self.db_manager.staging_path(self.recording_video_path))
+                    self.record_button.setText("Zastaviť")
+                    self.capture_button.setEnabled(False)
+        except StorageError as error:
+            self.recording_visit_id = None
+            show_storage_error(self, error)
+
+        # Resume camera
+        self.timer.start(30)
+
+    def update_recording_status(self):
+        elapsed = self.recorder.elapsed()
+        if elapsed >= RECORDING_MAX_SECONDS or self.recorder.error:
+            self.stop_recording()
+            return
+        self.statusBar().showMessage(
+            f"Nahrávanie {int(elapsed) // 60:02d}:{int(elapsed) % 60:02d}  (zahodené snímky: {self.recorder.frames_dropped})")
+
+    def stop_recording(self):
+        recorder = self.recorder
+        self.recorder = None
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            recorder.stop()
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+
+        self.record_button.setText("Nahrávať")
+        self.capture_button.setEnabled(True)
+        self.statusBar().clearMessage()
+
+        visit_id = self.recording_visit_id
+        video_path = self.recording_video_path
+        self.recording_visit_id = None
+        self.recording_video_path = None
+
+        if recorder.error:
+            # Without its video the visit would only hold the still of the first frame
+            try:
+                visit = self.db_manager.get_visit_by_id(visit_id)
+                self.db_manager.delete_visit(visit_id)
+                if visit is not None:
+                    self.db_manager.delete_file(visit['image_path'])
+            except (StorageError, OSError):
+                pass
+            # The video was never stored; drop what the encoder left of it
+            try:
+                os.remove(recorder.path)
+            except OSError:
+                pass
+            QtWidgets.QMessageBox.critical(self, "Recording Error", f"{recorder.error}\nVizita nahrávky nebola uložená.")
+            return
+        try:
+            self.db_manager.store_file(video_path, recorder.path)
+            self.db_manager.add_recording(visit_id, video_path, recorder.duration,
+                                          recorder.frames_written, recorder.frames_dropped)
+        except StorageError as error:
+            # The encoded file stays where the recorder wrote it
+            show_storage_error(self, f"{error}\n\nNahrávka je uložená v {os.path.abspath(recorder.path)}.")
+            return
+        self.statusBar().showMessage(
+            f"Nahrávka uložená: {recorder.frames_written} snímok, zahodené: {recorder.frames_dropped}", 5000)
+
     def display_captured_image(self):
         # Open Image Edit Dialog in Guest Mode
         self.image_edit_dialog = ImageEditDialog(self.current_frame)
@@ -411,17 +2828,67 @@ class PodoscopeApp(QtWidgets.QMainWindow):
         self.timer.start(30)
 
     def view_visits(self):
-        dialog = VisitsDialog(self.db_manager)
+        try:
+            dialog = VisitsDialog(self.db_manager)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         dialog.exec_()
 
+    def import_data(self):
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Importovať zákazníkov", "", "CSV / JSONL (*.csv *.jsonl)")
+        if not path:
+            return
+        stats = DataTransferDialog(self, "Import", import_file, path).run()
+        if stats is None:
+            return
+        summary = (f"Noví zákazníci: {stats.get('customers_added', 0)}\n"
+                   f"Existujúci zákazníci: {stats.get('customers_existing', 0)}\n"
+                   f"Nové vizity: {stats.get('visits_added', 0)}\n"
+                   f"Duplicitné vizity: {stats.get('visits_duplicate', 0)}\n"
+                   f"Vizity bez obrázka: {stats['visits_skipped']}\n"
+                   f"Odmietnuté riadky: {stats['rows_rejected']}")
+        if stats['errors']:
+            summary += "\n\n" + "\n".join(stats['errors'])
+        QtWidgets.QMessageBox.information(self, "Import", summary)
+
+    def check_gallery(self):
+        # The video of a running recording is not in the database until it stops
+        busy_paths = [self.db_manager.staging_path(self.recording_video_path)] if self.recorder is not None else []
+        report = DataTransferDialog(self, "Kontrola galérie", reconcile_gallery, busy_paths).run()
+        if report is not None:
+            dialog = GalleryCheckDialog(report, busy_paths)
+            dialog.exec_()
+
     def show_about_dialog(self):
         QtWidgets.QMessageBox.about(self, "O aplikácii", "Podoscope Application\nVerzia 1.0\n© 2023")
 
     def closeEvent(self, event):
-        # Release the camera when the application is closed
-        self.cap.release()
+        # Finish any running recording and release the camera when the application is closed
+        if self.recorder is not None:
+            self.stop_recording()
+        # The cameras may still be opening on the startup worker
+        self.startup_worker.wait()
+        # Each stream releases its own capture once its thread has exited
+        for stream in self.streams:
+            stream.stop()
         event.accept()
 
+def export_customers(parent, customers):
+    if not customers:
+        return
+    default_name = "podoscope_export.zip"
+    if len(customers) == 1:
+        default_name = f"{customers[0]['first_name']}_{customers[0]['last_name']}.zip"
+    path, _ = QtWidgets.QFileDialog.getSaveFileName(parent, "Exportovať", default_name, "ZIP (*.zip);;TAR (*.tar *.tar.gz)")
+    if not path:
+        return
+    stats = DataTransferDialog(parent, "Export", export_archive, path, {customer['id'] for customer in customers}).run()
+    if stats is not None:
+        QtWidgets.QMessageBox.information(parent, "Export",
+                                          f"Zákazníci: {stats['customers']}\nVizity: {stats['visits']}\n"
+                                          f"Súbory: {stats['files']}\nChýbajúce súbory: {stats['missing_files']}")
+
 # Customer Selection Dialog
 class CustomerSelectionDialog(QtWidgets.QDialog):
     def __init__(self, db_manager):
@@ -476,7 +2943,11 @@ class CustomerSelectionDialog(QtWidgets.QDialog):
 
     def update_customer_list(self):
         search_text = self.search_bar.text()
-        customers = self.db_manager.search_customers(search_text)
+        try:
+            customers = self.db_manager.search_customers(search_text)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         self.customer_list.clear()
         for customer in customers:
             item_text = f"{customer['first_name']} {customer['last_name']} - {customer['phone']}"
@@ -505,13 +2976,16 @@ class CustomerSelectionDialog(QtWidgets.QDialog):
 
 # Image Edit Dialog
 class ImageEditDialog(QtWidgets.QDialog):
-    def __init__(self, image, image_path=None, visit_id=None, db_manager=None):
+    def __init__(self, image, image_path=None, visit_id=None, db_manager=None, mask_region=None):
         super().__init__()
         self.original_image = image
         self.edit_image = image.copy()
         self.image_path = image_path
         self.visit_id = visit_id
         self.db_manager = db_manager
+        # Filters of a masked capture only touch the mask's bounding rectangle
+        self.mask_region = mask_region
+        self.auto_values = None
         self.initUI()
 
     def initUI(self):
@@ -523,10 +2997,8 @@ class ImageEditDialog(QtWidgets.QDialog):
         layout = QtWidgets.QVBoxLayout()
 
         # Image display
-        self.image_label = QtWidgets.QLabel()
-        self.image_label.setAlignment(QtCore.Qt.AlignCenter)
-        self.image_label.setFixedSize(640, 480)
-        layout.addWidget(self.image_label)
+        self.image_view = TiledImageView()
+        layout.addWidget(self.image_view, 1)
 
         self.show_image(self.edit_image)
 
@@ -565,6 +3037,18 @@ class ImageEditDialog(QtWidgets.QDialog):
         filter_layout.addWidget(QtWidgets.QLabel("Tiene"), 3, 0)
         filter_layout.addWidget(self.shading_slider, 3, 1)
 
+        # Auto enhance
+        auto_layout = QtWidgets.QHBoxLayout()
+        self.auto_button = QtWidgets.QPushButton("Automaticky upraviť")
+        self.auto_button.clicked.connect(self.auto_enhance)
+        self.auto_on_capture_checkbox = QtWidgets.QCheckBox("Automaticky pri snímaní")
+        self.auto_on_capture_checkbox.setChecked(bool(load_settings().get('auto_enhance', False)))
+        self.auto_on_capture_checkbox.toggled.connect(self.save_auto_on_capture)
+        auto_layout.addWidget(self.auto_button)
+        auto_layout.addWidget(self.auto_on_capture_checkbox)
+        auto_layout.addStretch()
+        filter_layout.addLayout(auto_layout, 4, 1)
+
         layout.addLayout(filter_layout)
 
         # Note field
@@ -585,6 +3069,9 @@ class ImageEditDialog(QtWidgets.QDialog):
 
         self.setLayout(layout)
 
+        if self.auto_on_capture_checkbox.isChecked():
+            self.auto_enhance()
+
     def apply_dark_theme(self):
         self.setStyleSheet("""
             QDialog {
@@ -592,18 +3079,39 @@ class ImageEditDialog(QtWidgets.QDialog):
             }
         """)
 
+    def auto_enhance(self):
+        values = compute_auto_enhance(self.original_image)
+        if values is None:
+            return
+        self.auto_values = values
+        # Set all sliders first and filter once
+        sliders = {'brightness': self.brightness_slider, 'contrast': self.contrast_slider, 'shading': self.shading_slider}
+        for key, slider in sliders.items():
+            slider.blockSignals(True)
+            slider.setValue(values[key])
+            slider.blockSignals(False)
+        self.apply_filters()
+
+    def save_auto_on_capture(self, checked):
+        settings = load_settings()
+        settings['auto_enhance'] = checked
+        save_settings(settings)
+
+    def current_adjustments(self):
+        return {
+            'brightness': self.brightness_slider.value(),
+            'contrast': self.contrast_slider.value(),
+            'saturation': self.saturation_slider.value(),
+            'shading': self.shading_slider.value(),
+        }
+
     def show_image(self, image):
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        height, width, channel = image.shape
-        bytesPerLine = channel * width
-        q_img = QtGui.QImage(image.data, width, height, bytesPerLine, QtGui.QImage.Format_RGB888)
-        pixmap = QtGui.QPixmap.fromImage(q_img)
-        # Scale pixmap to fit label size
-        pixmap = pixmap.scaled(self.image_label.width(), self.image_label.height(), QtCore.Qt.KeepAspectRatio)
-        self.image_label.setPixmap(pixmap)
+        self.image_view.set_image(image)
 
     def apply_filters(self):
-        image = self.original_image.copy()
+        image = self.original_image
+        if self.mask_region is not None:
+            image = self.mask_region.crop(image)
 
         # Apply brightness and contrast
         brightness = self.brightness_slider.value()
@@ -629,18 +3137,29 @@ class ImageEditDialog(QtWidgets.QDialog):
                           for i in np.arange(0, 256)]).astype("uint8")
         image = cv2.LUT(image, table)
 
+        # Put the black border back around the filtered region
+        if self.mask_region is not None:
+            image = self.mask_region.compose(image)
+
         self.edit_image = image
         self.show_image(self.edit_image)
 
     def save_edited_image(self):
         if self.image_path and self.visit_id and self.db_manager:
-            # Overwrite the existing image
-            cv2.imwrite(self.image_path, self.edit_image)
-            # Update note in database
-            note = self.note_field.toPlainText()
-            cursor = self.db_manager.conn.cursor()
-            cursor.execute('UPDATE visits SET note = ? WHERE id = ?', (note, self.visit_id))
-            self.db_manager.conn.commit()
+            # Remember the filter values and whether they came from auto enhance untouched
+            adjustments = self.current_adjustments()
+            auto = self.auto_values is not None and all(adjustments[key] == value for key, value in self.auto_values.items())
+            try:
+                # Overwrite the existing image
+                self.db_manager.store_image(self.image_path, self.edit_image)
+                # Update note in database
+                note = self.note_field.toPlainText()
+                self.db_manager.update_visit_note(self.visit_id, note)
+                self.db_manager.save_visit_adjustments(self.visit_id, auto=auto, **adjustments)
+            except StorageError as error:
+                # The dialog stays open, so saving can be tried again
+                show_storage_error(self, error)
+                return
             QtWidgets.QMessageBox.information(self, "Úspech", "Obrázok a poznámka boli úspešne uložené!")
             self.accept()
         else:
@@ -704,7 +3223,11 @@ class AddCustomerDialog(QtWidgets.QDialog):
             return
 
         # Add customer to the database
-        self.db_manager.add_customer(first_name, last_name, age, phone, email)
+        try:
+            self.db_manager.add_customer(first_name, last_name, age, phone, email)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         self.accept()
 
 # List Customers Dialog
@@ -738,8 +3261,11 @@ class ListCustomersDialog(QtWidgets.QDialog):
         self.add_button.clicked.connect(self.add_customer)
         self.delete_button = QtWidgets.QPushButton("Odstrániť")
         self.delete_button.clicked.connect(self.delete_customer)
+        self.export_button = QtWidgets.QPushButton("Exportovať")
+        self.export_button.clicked.connect(self.export_selected)
         button_layout.addWidget(self.add_button)
         button_layout.addWidget(self.delete_button)
+        button_layout.addWidget(self.export_button)
         layout.addLayout(button_layout)
 
         self.setLayout(layout)
@@ -754,7 +3280,11 @@ class ListCustomersDialog(QtWidgets.QDialog):
         """)
 
     def load_customers(self):
-        customers = self.db_manager.get_all_customers()
+        try:
+            customers = self.db_manager.get_all_customers()
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         self.customer_table.setRowCount(0)
         for customer in customers:
             row_position = self.customer_table.rowCount()
@@ -772,8 +3302,12 @@ class ListCustomersDialog(QtWidgets.QDialog):
             self.load_customers()
 
     def open_visits_for_customer(self, row, column):
-        customer_id = self.db_manager.get_all_customers()[row]['id']
-        dialog = VisitsDialog(self.db_manager)
+        try:
+            customer_id = self.db_manager.get_all_customers()[row]['id']
+            dialog = VisitsDialog(self.db_manager)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         dialog.customer_filter_combo.setCurrentIndex(dialog.customer_filter_combo.findData(customer_id))
         dialog.exec_()
 
@@ -782,12 +3316,22 @@ class ListCustomersDialog(QtWidgets.QDialog):
         if selected_rows:
             response = QtWidgets.QMessageBox.question(self, "Potvrdiť odstránenie", "Naozaj chcete odstrániť vybraných zákazníkov?")
             if response == QtWidgets.QMessageBox.Yes:
-                for index in selected_rows:
-                    row = index.row()
-                    customer_id = self.db_manager.get_all_customers()[row]['id']
-                    self.db_manager.delete_customer(customer_id)
+                try:
+                    customers = self.db_manager.get_all_customers()
+                    self.db_manager.batch([('delete_customer', (customers[index.row()]['id'],)) for index in selected_rows])
+                except StorageError as error:
+                    show_storage_error(self, error)
                 self.load_customers()
 
+    def export_selected(self):
+        selected_rows = self.customer_table.selectionModel().selectedRows()
+        try:
+            customers = self.db_manager.get_all_customers()
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
+        export_customers(self, [customers[index.row()] for index in selected_rows])
+
 # Visits Dialog with Filters
 class VisitsDialog(QtWidgets.QDialog):
     def __init__(self, db_manager):
@@ -841,6 +3385,17 @@ class VisitsDialog(QtWidgets.QDialog):
         self.visits_table.verticalHeader().setVisible(False)
         layout.addWidget(self.visits_table)
 
+        # Buttons
+        button_layout = QtWidgets.QHBoxLayout()
+        self.compare_button = QtWidgets.QPushButton("Porovnať")
+        self.compare_button.clicked.connect(self.compare_visits)
+        self.report_button = QtWidgets.QPushButton("PDF história")
+        self.report_button.clicked.connect(self.create_report)
+        button_layout.addStretch()
+        button_layout.addWidget(self.report_button)
+        button_layout.addWidget(self.compare_button)
+        layout.addLayout(button_layout)
+
         self.setLayout(layout)
 
         self.load_visits()
@@ -857,22 +3412,25 @@ class VisitsDialog(QtWidgets.QDialog):
         date_from = self.date_from.date().toPyDate()
         date_to = self.date_to.date().toPyDate()
 
-        visits = self.db_manager.get_all_visits()
-        filtered_visits = []
-        for visit in visits:
-            visit_date = datetime.strptime(visit['date'], '%Y-%m-%d %H:%M:%S').date()
-            if (customer_id == 0 or visit['customer_id'] == customer_id) and (date_from <= visit_date <= date_to):
-                filtered_visits.append(visit)
+        # Filter on the indexed epoch column; the end date is inclusive
+        range_start = int(datetime.combine(date_from, datetime.min.time()).timestamp())
+        range_end = int(datetime.combine(date_to + timedelta(days=1), datetime.min.time()).timestamp())
+        try:
+            visits = self.db_manager.get_visits_in_range(range_start, range_end, customer_id)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
 
         self.visits_table.setRowCount(0)
-        for visit in filtered_visits:
-            customer = self.db_manager.get_customer_by_id(visit['customer_id'])
-            customer_name = f"{customer['first_name']} {customer['last_name']}"
+        for visit in visits:
+            customer_name = f"{visit['first_name'] or ''} {visit['last_name'] or ''}".strip()
             row_position = self.visits_table.rowCount()
             self.visits_table.insertRow(row_position)
-            self.visits_table.setItem(row_position, 0, QtWidgets.QTableWidgetItem(customer_name))
+            name_item = QtWidgets.QTableWidgetItem(customer_name)
+            name_item.setData(QtCore.Qt.UserRole, visit['id'])
+            self.visits_table.setItem(row_position, 0, name_item)
             self.visits_table.setItem(row_position, 1, QtWidgets.QTableWidgetItem(visit['date']))
-            self.visits_table.setItem(row_position, 2, QtWidgets.QTableWidgetItem(os.path.basename(visit['image_path'])))
+            self.visits_table.setItem(row_position, 2, QtWidgets.QTableWidgetItem(os.path.basename(visit['image_path'] or '')))
             self.visits_table.setItem(row_position, 3, QtWidgets.QTableWidgetItem(visit['note']))
 
             # Actions (View Button)
@@ -881,10 +3439,50 @@ class VisitsDialog(QtWidgets.QDialog):
             self.visits_table.setCellWidget(row_position, 4, view_button)
 
     def view_visit(self, visit_id):
-        visit = self.db_manager.get_visit_by_id(visit_id)
-        dialog = VisitDetailsDialog(self.db_manager, visit)
+        try:
+            visit = self.db_manager.get_visit_by_id(visit_id)
+            dialog = VisitDetailsDialog(self.db_manager, visit)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
+        dialog.exec_()
+
+    def compare_visits(self):
+        selected_rows = self.visits_table.selectionModel().selectedRows()
+        if len(selected_rows) != 2:
+            QtWidgets.QMessageBox.warning(self, "Chyba", "Vyberte presne dve vizity na porovnanie.")
+            return
+        try:
+            visits = self.db_manager.batch([('get_visit_by_id', (self.visits_table.item(index.row(), 0).data(QtCore.Qt.UserRole),))
+                                            for index in selected_rows])
+            if visits[0]['customer_id'] != visits[1]['customer_id']:
+                QtWidgets.QMessageBox.warning(self, "Chyba", "Porovnať je možné iba vizity toho istého zákazníka.")
+                return
+            # The older visit is always the reference
+            visits.sort(key=lambda visit: visit['id'])
+            dialog = VisitComparisonDialog(self.db_manager, visits[0], visits[1])
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         dialog.exec_()
 
+    def create_report(self):
+        # Selected visits, or every visit in the table when nothing is selected
+        rows = [index.row() for index in self.visits_table.selectionModel().selectedRows()]
+        if not rows:
+            rows = range(self.visits_table.rowCount())
+        try:
+            visits = self.db_manager.batch([('get_visit_by_id', (self.visits_table.item(row, 0).data(QtCore.Qt.UserRole),))
+                                            for row in rows])
+            if not visits:
+                return
+            if len({visit['customer_id'] for visit in visits}) != 1:
+                QtWidgets.QMessageBox.warning(self, "Chyba", "Správu je možné vytvoriť iba pre jedného zákazníka.")
+                return
+            report_generator(self.db_manager).generate(visits, open_report)
+        except StorageError as error:
+            show_storage_error(self, error)
+
 # Visit Details Dialog
 class VisitDetailsDialog(QtWidgets.QDialog):
     def __init__(self, db_manager, visit):
@@ -902,21 +3500,32 @@ class VisitDetailsDialog(QtWidgets.QDialog):
         layout = QtWidgets.QVBoxLayout()
 
         # Image display
-        self.image_label = QtWidgets.QLabel()
-        self.image_label.setAlignment(QtCore.Qt.AlignCenter)
-        self.image_label.setFixedSize(640, 480)
-        layout.addWidget(self.image_label)
-
-        image = cv2.imread(self.visit['image_path'])
-        if image is not None:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            height, width, channel = image.shape
-            bytesPerLine = channel * width
-            q_img = QtGui.QImage(image.data, width, height, bytesPerLine, QtGui.QImage.Format_RGB888)
-            pixmap = QtGui.QPixmap.fromImage(q_img)
-            # Scale pixmap to fit label size
-            pixmap = pixmap.scaled(self.image_label.width(), self.image_label.height(), QtCore.Qt.KeepAspectRatio)
-            self.image_label.setPixmap(pixmap)
+        self.image_view = TiledImageView()
+        layout.addWidget(self.image_view, 1)
+
+        self.show_visit_image(self.visit['image_path'])
+
+        # Images from the additional cameras
+        visit_images = self.db_manager.get_visit_images(self.visit['id'])
+        if visit_images:
+            self.camera_combo = QtWidgets.QComboBox()
+            self.camera_combo.addItem("Plantárna kamera", self.visit['image_path'])
+            for visit_image in visit_images:
+                self.camera_combo.addItem(f"Kamera {visit_image['camera']}", visit_image['image_path'])
+            self.camera_combo.currentIndexChanged.connect(
+                lambda index: self.show_visit_image(self.camera_combo.itemData(index)))
+            layout.addWidget(self.camera_combo)
+
+        # Recordings
+        recordings = self.db_manager.get_recordings_by_visit_id(self.visit['id'])
+        if recordings:
+            recordings_layout = QtWidgets.QHBoxLayout()
+            for recording in recordings:
+                play_button = QtWidgets.QPushButton(f"Prehrať nahrávku ({recording['duration']:.0f} s)")
+                play_button.clicked.connect(lambda checked, path=recording['video_path']: self.play_recording(path))
+                recordings_layout.addWidget(play_button)
+            recordings_layout.addStretch()
+            layout.addLayout(recordings_layout)
 
         # Note
         self.note_field = QtWidgets.QTextEdit()
@@ -927,9 +3536,12 @@ class VisitDetailsDialog(QtWidgets.QDialog):
         button_layout = QtWidgets.QHBoxLayout()
         self.save_button = QtWidgets.QPushButton("Uložiť poznámku")
         self.save_button.clicked.connect(self.save_note)
+        self.report_button = QtWidgets.QPushButton("PDF správa")
+        self.report_button.clicked.connect(self.create_report)
         self.close_button = QtWidgets.QPushButton("Zavrieť")
         self.close_button.clicked.connect(self.reject)
         button_layout.addStretch()
+        button_layout.addWidget(self.report_button)
         button_layout.addWidget(self.close_button)
         button_layout.addWidget(self.save_button)
         layout.addLayout(button_layout)
@@ -945,13 +3557,303 @@ class VisitDetailsDialog(QtWidgets.QDialog):
 
     def save_note(self):
         note = self.note_field.toPlainText()
-        cursor = self.db_manager.conn.cursor()
-        cursor.execute('UPDATE visits SET note = ? WHERE id = ?', (note, self.visit['id']))
-        self.db_manager.conn.commit()
+        try:
+            self.db_manager.update_visit_note(self.visit['id'], note)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
         QtWidgets.QMessageBox.information(self, "Úspech", "Poznámka bola úspešne uložená!")
 
+    def create_report(self):
+        try:
+            report_generator(self.db_manager).generate([self.db_manager.get_visit_by_id(self.visit['id'])], open_report)
+        except StorageError as error:
+            show_storage_error(self, error)
+
+    def show_visit_image(self, image_path):
+        try:
+            image = self.db_manager.load_image(image_path)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
+        if image is not None:
+            self.image_view.set_image(image)
+
+    def play_recording(self, video_path):
+        try:
+            local_path = self.db_manager.local_file(video_path)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
+        if local_path is None:
+            QtWidgets.QMessageBox.warning(self, "Chyba", "Súbor nahrávky sa nenašiel.")
+            return
+        QtGui.QDesktopServices.openUrl(QtCore.QUrl.fromLocalFile(os.path.abspath(local_path)))
+
+# Visit Comparison Dialog
+class VisitComparisonDialog(QtWidgets.QDialog):
+    MODE_SIDE_BY_SIDE = 0
+    MODE_OVERLAY = 1
+    MODE_DIFFERENCE = 2
+
+    def __init__(self, db_manager, visit_a, visit_b):
+        super().__init__()
+        self.db_manager = db_manager
+        self.visit_a = visit_a
+        self.visit_b = visit_b
+        self.reference_image = db_manager.load_image(visit_a['image_path'])
+        self.moving_image = db_manager.load_image(visit_b['image_path'])
+        self.aligned_image = None
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("Porovnanie vizít")
+        self.resize(800, 600)
+
+        self.apply_dark_theme()
+
+        layout = QtWidgets.QVBoxLayout()
+
+        # Image display
+        self.image_view = TiledImageView()
+        layout.addWidget(self.image_view, 1)
+
+        self.info_label = QtWidgets.QLabel(f"{self.visit_a['date']}  ↔  {self.visit_b['date']}")
+        self.info_label.setAlignment(QtCore.Qt.AlignCenter)
+        layout.addWidget(self.info_label)
+
+        # View options
+        options_layout = QtWidgets.QGridLayout()
+        self.mode_combo = QtWidgets.QComboBox()
+        self.mode_combo.addItem("Vedľa seba", self.MODE_SIDE_BY_SIDE)
+        self.mode_combo.addItem("Prekrytie", self.MODE_OVERLAY)
+        self.mode_combo.addItem("Rozdiel", self.MODE_DIFFERENCE)
+        self.mode_combo.currentIndexChanged.connect(self.update_view)
+        options_layout.addWidget(QtWidgets.QLabel("Zobrazenie"), 0, 0)
+        options_layout.addWidget(self.mode_combo, 0, 1)
+
+        self.blend_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.blend_slider.setRange(0, 100)
+        self.blend_slider.setValue(50)
+        self.blend_slider.valueChanged.connect(self.update_view)
+        options_layout.addWidget(QtWidgets.QLabel("Prelínanie"), 1, 0)
+        options_layout.addWidget(self.blend_slider, 1, 1)
+        layout.addLayout(options_layout)
+
+        # Buttons
+        button_layout = QtWidgets.QHBoxLayout()
+        self.realign_button = QtWidgets.QPushButton("Znova zarovnať")
+        self.realign_button.clicked.connect(lambda: self.align_images(force=True))
+        self.close_button = QtWidgets.QPushButton("Zavrieť")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addStretch()
+        button_layout.addWidget(self.realign_button)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+        if self.reference_image is None or self.moving_image is None:
+            self.info_label.setText("Obrázok vizity sa nepodarilo načítať.")
+            self.mode_combo.setEnabled(False)
+            self.blend_slider.setEnabled(False)
+            self.realign_button.setEnabled(False)
+            return
+
+        self.align_images()
+
+    def apply_dark_theme(self):
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #2e2e2e;
+            }
+        """)
+
+    def align_images(self, force=False):
+        visit_a_id = self.visit_a['id']
+        visit_b_id = self.visit_b['id']
+        try:
+            # The cache entry is only valid while neither image has been re-saved
+            source_stamp = f"{self.db_manager.image_stamp(self.visit_a['image_path'])}|{self.db_manager.image_stamp(self.visit_b['image_path'])}"
+
+            alignment = None if force else self.db_manager.get_visit_alignment(visit_a_id, visit_b_id)
+            if alignment and alignment['source_stamp'] == source_stamp:
+                matrix = alignment['matrix']
+            else:
+                QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+                try:
+                    method, matrix = register_images(self.reference_image, self.moving_image)
+                finally:
+                    QtWidgets.QApplication.restoreOverrideCursor()
+                self.db_manager.save_visit_alignment(visit_a_id, visit_b_id, method, matrix, source_stamp)
+        except StorageError as error:
+            show_storage_error(self, error)
+            return
+
+        self.aligned_image = warp_to_reference(self.reference_image, self.moving_image, matrix)
+        self.update_view()
+
+    def update_view(self):
+        if self.aligned_image is None:
+            return
+        mode = self.mode_combo.currentData()
+        self.blend_slider.setEnabled(mode == self.MODE_OVERLAY)
+
+        if mode == self.MODE_OVERLAY:
+            alpha = self.blend_slider.value() / 100.0
+            image = cv2.addWeighted(self.reference_image, 1.0 - alpha, self.aligned_image, alpha, 0)
+        elif mode == self.MODE_DIFFERENCE:
+            difference = cv2.absdiff(cv2.cvtColor(self.reference_image, cv2.COLOR_BGR2GRAY),
+                                     cv2.cvtColor(self.aligned_image, cv2.COLOR_BGR2GRAY))
+            image = cv2.applyColorMap(difference, cv2.COLORMAP_JET)
+        else:
+            image = np.hstack([self.reference_image, self.aligned_image])
+
+        self.image_view.set_image(image)
+
+# Gallery Check Dialog
+class GalleryCheckDialog(QtWidgets.QDialog):
+    def __init__(self, report, busy_paths=()):
+        super().__init__()
+        self.report = report
+        self.busy_paths = list(busy_paths)
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("Kontrola galérie")
+        self.resize(800, 500)
+
+        self.apply_dark_theme()
+
+        layout = QtWidgets.QVBoxLayout()
+
+        self.summary_label = QtWidgets.QLabel()
+        layout.addWidget(self.summary_label)
+
+        # Problems found
+        self.problem_table = QtWidgets.QTableWidget()
+        self.problem_table.setColumnCount(2)
+        self.problem_table.setHorizontalHeaderLabels(['Problém', 'Položka'])
+        self.problem_table.horizontalHeader().setStretchLastSection(True)
+        self.problem_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.problem_table)
+
+        # Cleanup options
+        self.orphaned_files_checkbox = QtWidgets.QCheckBox("Odstrániť súbory bez vizity")
+        self.orphaned_visits_checkbox = QtWidgets.QCheckBox("Odstrániť vizity odstránených zákazníkov")
+        layout.addWidget(self.orphaned_files_checkbox)
+        layout.addWidget(self.orphaned_visits_checkbox)
+
+        # Buttons
+        button_layout = QtWidgets.QHBoxLayout()
+        self.clean_button = QtWidgets.QPushButton("Vyčistiť")
+        self.clean_button.clicked.connect(self.clean)
+        self.close_button = QtWidgets.QPushButton("Zavrieť")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addStretch()
+        button_layout.addWidget(self.close_button)
+        button_layout.addWidget(self.clean_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+        self.load_report()
+
+    def apply_dark_theme(self):
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #2e2e2e;
+            }
+        """)
+
+    def load_report(self):
+        report = self.report
+        self.summary_label.setText(
+            f"Súbory v galérii: {report['files']} (prepočítané: {report['hashed']})\n"
+            f"Súbory bez vizity: {len(report['orphaned_files'])}, chýbajúce súbory: {len(report['missing'])}, "
+            f"duplikáty: {len(report['duplicates'])}, vizity bez zákazníka: {len(report['orphaned_visits'])}")
+
+        problems = [("Súbor bez vizity", path) for path in report['orphaned_files']]
+        problems += [("Chýbajúci súbor", f"Vizita {missing['visit_id']}: {missing['path']}") for missing in report['missing']]
+        problems += [("Duplikát", ", ".join(paths)) for paths in report['duplicates']]
+        problems += [("Vizita bez zákazníka", f"Vizita {visit['id']} ({visit['date']})") for visit in report['orphaned_visits']]
+        self.problem_table.setRowCount(0)
+        for problem, item in problems:
+            row_position = self.problem_table.rowCount()
+            self.problem_table.insertRow(row_position)
+            self.problem_table.setItem(row_position, 0, QtWidgets.QTableWidgetItem(problem))
+            self.problem_table.setItem(row_position, 1, QtWidgets.QTableWidgetItem(item))
+
+        self.orphaned_files_checkbox.setEnabled(bool(report['orphaned_files']))
+        self.orphaned_files_checkbox.setChecked(False)
+        self.orphaned_visits_checkbox.setEnabled(bool(report['orphaned_visits']))
+        self.orphaned_visits_checkbox.setChecked(False)
+        self.clean_button.setEnabled(bool(report['orphaned_files'] or report['orphaned_visits']))
+
+    def clean(self):
+        orphaned_files = self.report['orphaned_files'] if self.orphaned_files_checkbox.isChecked() else []
+        orphaned_visit_ids = ([visit['id'] for visit in self.report['orphaned_visits']]
+                              if self.orphaned_visits_checkbox.isChecked() else [])
+        if not orphaned_files and not orphaned_visit_ids:
+            return
+        response = QtWidgets.QMessageBox.question(
+            self, "Potvrdiť odstránenie",
+            f"Naozaj chcete odstrániť {len(orphaned_files)} súborov a {len(orphaned_visit_ids)} vizít?")
+        if response != QtWidgets.QMessageBox.Yes:
+            return
+        stats = DataTransferDialog(self, "Čistenie galérie", clean_gallery,
+                                   orphaned_files, orphaned_visit_ids, self.busy_paths).run()
+        if stats is None:
+            return
+        if stats['files_failed']:
+            QtWidgets.QMessageBox.warning(self, "Chyba", "Tieto súbory sa nepodarilo odstrániť:\n" + "\n".join(stats['files_failed']))
+        # Check again, the index makes this quick
+        report = DataTransferDialog(self, "Kontrola galérie", reconcile_gallery, self.busy_paths).run()
+        if report is not None:
+            self.report = report
+            self.load_report()
+
+def write_startup_report():
+    report = startup_timer.report()
+    print(report, file=sys.stderr)
+    with open(STARTUP_REPORT_PATH, 'w', encoding='utf-8') as report_file:
+        report_file.write(report + "\n")
+
+def serve(host, port):
+    # Share this workstation's podoscope.db and Gallery with the other stations
+    storage = storage_settings()
+    host = host or storage.get('host', SERVER_HOST)
+    token = storage.get('token')
+    if not token and host not in LOOPBACK_HOSTS:
+        print(f"Refusing to serve on {host} without a token: set \"storage\": {{\"token\": \"...\"}} in {SETTINGS_PATH}.",
+              file=sys.stderr)
+        sys.exit(1)
+    server = run_server(host, port or storage.get('port', SERVER_PORT), token=token)
+    print(f"Podoscope store served on {server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', action='store_true', help='run the shared store service instead of the GUI')
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--startup-report', action='store_true', help='print where launch time is spent')
+    options, qt_arguments = parser.parse_known_args()
+    if options.serve:
+        serve(options.host, options.port)
+        sys.exit(0)
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_arguments)
+    startup_timer.mark("qt application")
     window = PodoscopeApp()
+    startup_timer.mark("window created")
     window.show()
+    startup_timer.mark("window shown")
+    if options.startup_report:
+        app.aboutToQuit.connect(write_startup_report)
     sys.exit(app.exec_())